@@ -11,6 +11,46 @@ import glob
 from datetime import datetime
 import pytz
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:  # optional: fall back to the pandas C parser
+    pa = None
+
+# Source bars are stamped in UTC+3 with this layout
+DATETIME_FORMAT = '%Y.%m.%d %H:%M:%S'
+SOURCE_TZ = 'Etc/GMT-3'
+TARGET_TZ = 'America/New_York'
+
+def build_minute_of_week_rules():
+    """
+    Tabulate the trading hours filter for every minute of the week.
+
+    Returns:
+        int8 array indexed by minute of week (Monday 00:00 = 0):
+        0 = keep, 1 = weekend close (Rule 1), 2 = settlement halt (Rule 2)
+    """
+    mow = np.arange(7 * 1440)
+    mod = mow % 1440
+    rules = np.zeros(len(mow), dtype=np.int8)
+
+    # Rule 2: weekdays (mow < 5*1440) during the 17:00-17:59 settlement hour
+    rules[(mow < 5 * 1440) & (mod >= 17 * 60) & (mod < 18 * 60)] = 2
+
+    # Rule 1: Friday 17:01 (4*1440 + 17*60 + 1) through Sunday 17:59
+    # (6*1440 + 17*60 + 59); applied last so it wins the Friday 17:xx overlap
+    rules[(mow >= 6781) & (mow <= 9719)] = 1
+
+    return rules
+
+MINUTE_OF_WEEK_RULES = build_minute_of_week_rules()
+
+# Float magnitudes that Arrow and pandas both print positionally (pandas
+# switches float32 to scientific notation from 1e6); the Arrow CSV path is
+# only taken when every non-zero finite value falls inside
+ARROW_FLOAT_RANGE = (1e-3, 1e6)
+
 def load_and_merge_csv_files(data_dir='.', pattern='1m_data_part*.csv'):
     """
     Load and merge all CSV files matching the pattern.
@@ -32,17 +72,57 @@ def load_and_merge_csv_files(data_dir='.', pattern='1m_data_part*.csv'):
     for f in csv_files:
         print(f"  - {Path(f).name}")
 
-    # Load and merge
-    dfs = []
+    # Load and merge (multi-threaded Arrow parser when pyarrow is installed).
+    # Each part is time-ordered on its own (the exports run newest first), so
+    # every part is flipped to ascending and the parts are ordered by their
+    # first timestamp; disjoint parts then concatenate already sorted
+    parts = []
     for csv_file in csv_files:
         print(f"\nLoading {Path(csv_file).name}...", end=' ')
-        df = pd.read_csv(csv_file, sep='\t')
-        print(f"({len(df):,} rows)")
-        dfs.append(df)
+        if pa is not None:
+            # Memory-mapped input: the parser reads the page cache directly
+            # instead of copying the file through a buffered stream
+            with pa.memory_map(csv_file) as source:
+                df = pacsv.read_csv(
+                    source,
+                    parse_options=pacsv.ParseOptions(delimiter='\t')
+                )
+            print(f"({df.num_rows:,} rows)")
+            # Timestamps are parsed, localized and converted by Arrow
+            # kernels per part, and the one copy into pandas happens after
+            # the merge
+            col = df.schema.get_field_index('DateTime')
+            stamps = pc.strptime(df.column(col), format=DATETIME_FORMAT, unit='s')
+            stamps = pc.assume_timezone(stamps, SOURCE_TZ).cast(pa.timestamp('ns', tz=TARGET_TZ))
+            df = df.set_column(col, 'DateTime', stamps)
+            if df.num_rows == 0:
+                continue
+            first, last = stamps[0].value, stamps[-1].value
+            if first > last:
+                df = df.take(np.arange(df.num_rows - 1, -1, -1))
+        else:
+            # Parse DateTime in the same pass as the reader, with the fixed
+            # format, instead of materializing strings and parsing again
+            df = pd.read_csv(csv_file, sep='\t', parse_dates=['DateTime'],
+                             date_format=DATETIME_FORMAT)
+            print(f"({len(df):,} rows)")
+            if len(df) == 0:
+                continue
+            first, last = df['DateTime'].iloc[0], df['DateTime'].iloc[-1]
+            if first > last:
+                df = df.iloc[::-1]
+        parts.append((min(first, last), df))
+
+    parts.sort(key=lambda part: part[0])
+    dfs = [df for _, df in parts]
 
     # Concatenate all dataframes
     print("\nMerging all dataframes...")
-    merged_df = pd.concat(dfs, ignore_index=True)
+    if pa is not None:
+        # Arrow concatenation only links the column chunks
+        merged_df = pa.concat_tables(dfs).to_pandas()
+    else:
+        merged_df = pd.concat(dfs, ignore_index=True)
     print(f"Total rows before cleaning: {len(merged_df):,}")
 
     return merged_df, csv_files
@@ -61,36 +141,85 @@ def clean_and_convert_timezone(df):
     print("STEP 2: TIMEZONE CONVERSION & CLEANING")
     print("=" * 80)
 
-    # Parse datetime
-    print("\nParsing DateTime column...")
-    df['DateTime'] = pd.to_datetime(df['DateTime'], format='%Y.%m.%d %H:%M:%S')
-
-    # Sort by datetime
-    print("Sorting by timestamp...")
-    df = df.sort_values('DateTime').reset_index(drop=True)
-
-    # Remove duplicates
+    # Parse datetime (both loaders deliver it parsed already)
+    # cache=True parses each distinct string once and gathers the results
+    # when the column repeats values (overlapping part files); pandas skips
+    # the unique/gather pass when the strings are already unique
+    if not pd.api.types.is_datetime64_any_dtype(df['DateTime']):
+        print("\nParsing DateTime column...")
+        df['DateTime'] = pd.to_datetime(df['DateTime'], format=DATETIME_FORMAT,
+                                        cache=True)
+
+    # Sort by datetime, unless the loader already produced them in order
+    # (an O(n) check against an O(n log n) sort)
+    if df['DateTime'].is_monotonic_increasing:
+        print("Timestamps already in order, skipping sort")
+    else:
+        print("Sorting by timestamp...")
+        df = df.sort_values('DateTime').reset_index(drop=True)
+
+    # Remove duplicates: after the sort they are adjacent, so one pass of
+    # int64 comparisons replaces the hash-based drop_duplicates
     initial_count = len(df)
-    df = df.drop_duplicates(subset=['DateTime'], keep='first')
+    ts = df['DateTime'].values.view('i8')
+    keep = np.empty(len(ts), dtype=bool)
+    keep[:1] = True
+    np.not_equal(ts[1:], ts[:-1], out=keep[1:])
+    df = df[keep]
     duplicates_removed = initial_count - len(df)
     print(f"Removed {duplicates_removed:,} duplicate timestamps")
 
-    # Localize to UTC+3 (Etc/GMT-3)
-    print("\nLocalizing to UTC+3...")
-    df['DateTime'] = df['DateTime'].dt.tz_localize('Etc/GMT-3')
+    # Localize and convert on a DatetimeIndex directly, skipping the
+    # intermediate Series and column assignments
+    idx = pd.DatetimeIndex(df['DateTime'], name='DateTime')
+    if idx.tz is None:
+        # Localize to UTC+3 (Etc/GMT-3)
+        print("\nLocalizing to UTC+3...")
+        idx = idx.tz_localize(SOURCE_TZ)
 
-    # Convert to America/New_York
-    print("Converting to America/New_York timezone...")
-    df['DateTime'] = df['DateTime'].dt.tz_convert('America/New_York')
+        # Convert to America/New_York
+        print("Converting to America/New_York timezone...")
+        idx = idx.tz_convert(TARGET_TZ)
 
     # Set as index
-    df = df.set_index('DateTime')
+    df = df.drop(columns=['DateTime']).set_index(idx)
 
     print(f"\nDate range: {df.index.min()} to {df.index.max()}")
     print(f"Total rows after timezone conversion: {len(df):,}")
 
     return df
 
+def downcast_numeric_columns(df):
+    """
+    Downcast price columns to float32 and volume columns to unsigned ints.
+
+    float32 guarantees 6 significant decimal digits (FLT_DIG). The source
+    prices are quoted to 0.1 and stay below 100,000, i.e. at most 6
+    significant digits, so each one prints back as the same decimal through
+    the CSV export while every later step moves half the bytes. Prices of
+    100,000 or more, or finer than 0.1, would need float64.
+
+    Args:
+        df: DataFrame with OHLC and volume columns
+
+    Returns:
+        DataFrame with downcast numeric columns
+    """
+    before = df.memory_usage(deep=True).sum()
+
+    for col in ('Open', 'High', 'Low', 'Close'):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], downcast='float')
+    for col in ('Volume', 'TickVolume'):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], downcast='unsigned')
+
+    after = df.memory_usage(deep=True).sum()
+    print(f"\nDowncast numeric columns: {before / 1024**2:.1f} MB -> "
+          f"{after / 1024**2:.1f} MB ({after / before:.0%})")
+
+    return df
+
 def filter_trading_hours(df):
     """
     Filter data to include only NQ trading hours in America/New_York timezone.
@@ -111,43 +240,27 @@ def filter_trading_hours(df):
 
     initial_count = len(df)
 
-    # Add helper columns
-    df['dayofweek'] = df.index.dayofweek  # 0=Monday, 4=Friday, 6=Sunday
-    df['hour'] = df.index.hour
-    df['minute'] = df.index.minute
+    # Minute of week (Monday 00:00 = 0) straight from the local wall-clock
+    # int64 nanoseconds in one pass (1970-01-01 was a Thursday, dayofweek 3)
+    # rather than three dayofweek/hour/minute calendar decompositions
+    minutes = df.index.tz_localize(None).asi8 // 60_000_000_000
+    mow = ((minutes + 3 * 1440) % 10080).astype(np.int32)
+
+    # Both rules in one gather from the 10,080-entry table: a single int8
+    # array instead of a chain of intermediate boolean masks
+    rules = MINUTE_OF_WEEK_RULES[mow]
 
     # Rule 1: Remove Friday 17:01 ET to Sunday 17:59 ET
     print("\nApplying Rule 1: Remove Friday 17:01 - Sunday 17:59...")
-
-    # Friday after 17:00
-    friday_close = (df['dayofweek'] == 4) & ((df['hour'] > 17) | ((df['hour'] == 17) & (df['minute'] > 0)))
-
-    # Saturday (all day)
-    saturday = df['dayofweek'] == 5
-
-    # Sunday before 18:00
-    sunday_before_open = (df['dayofweek'] == 6) & (df['hour'] < 18)
-
-    weekend_mask = friday_close | saturday | sunday_before_open
-    weekend_removed = weekend_mask.sum()
-    df = df[~weekend_mask]
+    weekend_removed = np.count_nonzero(rules == 1)
     print(f"Removed {weekend_removed:,} weekend/non-trading rows")
 
     # Rule 2: Remove daily settlement halt (17:00-17:59 ET on Mon-Fri)
     print("\nApplying Rule 2: Remove daily settlement halt (17:00-17:59)...")
-
-    # Update dayofweek after filtering
-    df['dayofweek'] = df.index.dayofweek
-    df['hour'] = df.index.hour
-
-    # Weekdays during settlement hour
-    settlement_mask = (df['dayofweek'] < 5) & (df['hour'] == 17)
-    settlement_removed = settlement_mask.sum()
-    df = df[~settlement_mask]
+    settlement_removed = np.count_nonzero(rules == 2)
     print(f"Removed {settlement_removed:,} settlement halt rows")
 
-    # Drop helper columns
-    df = df.drop(columns=['dayofweek', 'hour', 'minute'])
+    df = df[rules == 0]
 
     final_count = len(df)
     total_removed = initial_count - final_count
@@ -158,6 +271,28 @@ def filter_trading_hours(df):
 
     return df
 
+def arrow_csv_compatible(df):
+    """
+    Check that the Arrow writer in export_clean_data reproduces df.to_csv:
+    numeric columns only, whole-second timestamps and floats inside
+    ARROW_FLOAT_RANGE.
+    """
+    if df.index.name is None or (df.index.asi8 % 1_000_000_000).any():
+        return False
+
+    low, high = ARROW_FLOAT_RANGE
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind in 'iu':
+            continue
+        if values.dtype.kind != 'f':
+            return False
+        magnitude = np.abs(values[np.isfinite(values) & (values != 0)])
+        if len(magnitude) and (magnitude.min() < low or magnitude.max() >= high):
+            return False
+
+    return True
+
 def export_clean_data(df, output_file='nq_1m_et.csv'):
     """
     Export cleaned data to CSV.
@@ -171,7 +306,27 @@ def export_clean_data(df, output_file='nq_1m_et.csv'):
     print("=" * 80)
 
     print(f"\nExporting to {output_file}...")
-    df.to_csv(output_file)
+    if pa is not None and arrow_csv_compatible(df):
+        # Multi-threaded Arrow writer, formatted to match df.to_csv byte for
+        # byte: ISO offsets (-05:00), whole floats keep their '.0' and the
+        # header is written unquoted by hand
+        table = pa.Table.from_pandas(df.reset_index(), preserve_index=False)
+        timestamps = table.column(0).cast(pa.timestamp('s', tz=str(df.index.tz)))
+        timestamps = pc.strftime(timestamps, format='%Y-%m-%d %H:%M:%S%z')
+        timestamps = pc.replace_substring_regex(timestamps, pattern=r'(\d\d)$', replacement=r':\1')
+        table = table.set_column(0, table.field(0).name, timestamps)
+        for i, field in enumerate(table.schema):
+            if pa.types.is_floating(field.type):
+                text = pc.cast(table.column(i), pa.string())
+                text = pc.if_else(pc.match_substring_regex(text, r'[.eEn]'), text,
+                                  pc.binary_join_element_wise(text, '.0', ''))
+                table = table.set_column(i, field.name, text)
+        with open(output_file, 'wb') as f:
+            f.write((','.join(table.column_names) + '\n').encode())
+            pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(
+                include_header=False, quoting_style='none'))
+    else:
+        df.to_csv(output_file)
 
     file_size = Path(output_file).stat().st_size / (1024**2)
     print(f"File saved: {output_file} ({file_size:.2f} MB)")
@@ -191,6 +346,7 @@ def main():
 
     # Step 2: Clean and convert timezone
     clean_df = clean_and_convert_timezone(merged_df)
+    clean_df = downcast_numeric_columns(clean_df)
 
     # Step 3: Filter trading hours
     filtered_df = filter_trading_hours(clean_df)
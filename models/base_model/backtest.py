@@ -38,22 +38,46 @@ COMMISSION_PER_CONTRACT = 2.50  # Round-trip commission
 # BACKTESTING ENGINE
 # ============================================================================
 
-class Trade:
-    """Represents a single trade."""
-    def __init__(self, date, direction, entry_price, variant, prob, sample_size):
-        self.date = date
-        self.direction = direction  # 'long' or 'short'
-        self.entry_price = entry_price
-        self.exit_price = None
-        self.target_level = None
-        self.variant = variant
-        self.probability = prob
-        self.sample_size = sample_size
-        self.points = None
-        self.pnl_gross = None
-        self.pnl_net = None
-        self.outcome = None  # 'win', 'loss', 'fail'
-        self.exit_reason = None
+def compute_trade_outcomes(is_long, first_sweep, both_flag, london_high, london_low, entry_price):
+    """
+    Outcome kernel for run_backtest, over all entered trades at once.
+
+    Args:
+        is_long: Boolean array, True for long trades and False for short
+        first_sweep: Array of first sweep sides ('High' / 'Low')
+        both_flag: Array, truthy when both London levels were hit
+        london_high, london_low, entry_price: Float arrays
+
+    Returns:
+        Dict of arrays: target_level, exit_price, win, exit_reason, points,
+        pnl_gross, pnl_net
+    """
+    # Target hit first wins; otherwise exit at the opposite level (a 'stop'
+    # when the target was also hit later)
+    target_level = np.where(is_long, london_high, london_low)
+    opposite_level = np.where(is_long, london_low, london_high)
+    win = np.where(is_long, first_sweep == 'High', first_sweep == 'Low')
+    exit_price = np.where(win, target_level, opposite_level)
+    exit_reason = np.where(win, 'target',
+                           np.where(np.asarray(both_flag).astype(bool), 'stop', 'opposite_level'))
+
+    # P&L with slippage on both entry and exit (updated in place: one array
+    # per output column, no intermediates)
+    points = np.subtract(exit_price, entry_price)
+    np.negative(points, out=points, where=~is_long)
+    points -= (SLIPPAGE_POINTS * 2)
+    pnl_gross = points * (POINTS_TO_DOLLARS * POSITION_SIZE)
+    pnl_net = pnl_gross - (COMMISSION_PER_CONTRACT * POSITION_SIZE)
+
+    return {
+        'target_level': target_level,
+        'exit_price': exit_price,
+        'win': win,
+        'exit_reason': exit_reason,
+        'points': points,
+        'pnl_gross': pnl_gross,
+        'pnl_net': pnl_net
+    }
 
 class BacktestEngine:
     """Backtesting engine for NY Probability Map."""
@@ -61,102 +85,13 @@ class BacktestEngine:
     def __init__(self, daily_data, prob_map):
         self.daily_data = daily_data
         self.prob_map = prob_map
-        self.trades = []
-        self.equity_curve = []
+        # Variant -> stats, indexed once instead of a boolean scan per lookup
+        self.prob_index = (prob_map.drop_duplicates('variant')
+                           .set_index('variant')[['n', 'first_high_pct']])
+        self.trades_df = pd.DataFrame()
+        self.equity_curve = pd.DataFrame()
         self.initial_capital = 10000  # Starting capital
 
-    def should_enter_trade(self, row):
-        """Determine if we should enter a trade based on variant probability."""
-        variant = row['variant']
-
-        # Find variant in probability map
-        variant_data = self.prob_map[self.prob_map['variant'] == variant]
-
-        if len(variant_data) == 0:
-            return None, None
-
-        variant_data = variant_data.iloc[0]
-
-        # Check reliability filters
-        if variant_data['n'] < MIN_SAMPLE_SIZE:
-            return None, None
-
-        reliability = 'High' if variant_data['n'] >= 150 else 'Medium' if variant_data['n'] >= 50 else 'Low'
-        if reliability == 'Low':
-            return None, None
-
-        p_high = variant_data['first_high_pct']
-
-        # Check entry thresholds
-        if p_high >= ENTRY_THRESHOLD_HIGH:
-            return 'long', variant_data
-        elif p_high <= ENTRY_THRESHOLD_LOW:
-            return 'short', variant_data
-        else:
-            return None, None
-
-    def calculate_trade_outcome(self, trade, row):
-        """Calculate trade outcome based on actual market behavior."""
-        # Set target based on direction
-        if trade.direction == 'long':
-            trade.target_level = row['london_high']
-            opposite_level = row['london_low']
-        else:  # short
-            trade.target_level = row['london_low']
-            opposite_level = row['london_high']
-
-        # Determine what happened
-        first_sweep = row['first_sweep_side']
-        both_hit = row['both_flag']
-
-        if trade.direction == 'long':
-            if first_sweep == 'High':
-                # Target hit first - WIN
-                trade.exit_price = trade.target_level
-                trade.outcome = 'win'
-                trade.exit_reason = 'target'
-            elif both_hit:
-                # Both hit, but low first - LOSS (stopped out then target hit)
-                trade.exit_price = opposite_level
-                trade.outcome = 'loss'
-                trade.exit_reason = 'stop'
-            else:
-                # Only low hit - LOSS
-                trade.exit_price = opposite_level
-                trade.outcome = 'loss'
-                trade.exit_reason = 'opposite_level'
-        else:  # short
-            if first_sweep == 'Low':
-                # Target hit first - WIN
-                trade.exit_price = trade.target_level
-                trade.outcome = 'win'
-                trade.exit_reason = 'target'
-            elif both_hit:
-                # Both hit, but high first - LOSS
-                trade.exit_price = opposite_level
-                trade.outcome = 'loss'
-                trade.exit_reason = 'stop'
-            else:
-                # Only high hit - LOSS
-                trade.exit_price = opposite_level
-                trade.outcome = 'loss'
-                trade.exit_reason = 'opposite_level'
-
-        # Calculate P&L
-        if trade.direction == 'long':
-            trade.points = trade.exit_price - trade.entry_price
-        else:
-            trade.points = trade.entry_price - trade.exit_price
-
-        # Apply slippage (both entry and exit)
-        trade.points -= (SLIPPAGE_POINTS * 2)
-
-        # Calculate dollar P&L
-        trade.pnl_gross = trade.points * POINTS_TO_DOLLARS * POSITION_SIZE
-        trade.pnl_net = trade.pnl_gross - (COMMISSION_PER_CONTRACT * POSITION_SIZE)
-
-        return trade
-
     def run_backtest(self):
         """Execute backtest on all historical data."""
         print("\n" + "="*80)
@@ -171,116 +106,121 @@ class BacktestEngine:
         print(f"  Slippage: {SLIPPAGE_POINTS} pts per side")
         print(f"  Commission: ${COMMISSION_PER_CONTRACT} round-trip")
 
-        cumulative_pnl = 0
-
-        for idx, row in self.daily_data.iterrows():
-            # Skip if no first sweep (no trade outcome)
-            if pd.isna(row['first_sweep_side']):
-                continue
-
-            # Check if we should enter trade
-            direction, variant_data = self.should_enter_trade(row)
-
-            if direction is None:
-                continue
-
-            # Create trade
-            # Entry at NY open (08:00)
-            entry_price = row['ny_open']
-
-            trade = Trade(
-                date=row['date'],
-                direction=direction,
-                entry_price=entry_price,
-                variant=row['variant'],
-                prob=variant_data['first_high_pct'],
-                sample_size=variant_data['n']
-            )
-
-            # Calculate outcome
-            trade = self.calculate_trade_outcome(trade, row)
-
-            # Track P&L
-            cumulative_pnl += trade.pnl_net
-
-            # Store trade
-            self.trades.append(trade)
-
-            # Track equity
-            self.equity_curve.append({
-                'date': row['date'],
-                'pnl': trade.pnl_net,
-                'cumulative_pnl': cumulative_pnl,
-                'equity': self.initial_capital + cumulative_pnl
-            })
-
-        print(f"\n✓ Backtest complete: {len(self.trades)} trades executed")
+        # Entry rules and trade outcomes are evaluated for every day at once.
+        # Only the columns the rules read are pulled out, as NumPy arrays,
+        # and the entry filter is applied to those rather than to copies of
+        # the full-width daily frame
+        cols = ['variant', 'first_sweep_side', 'both_flag',
+                'london_high', 'london_low', 'ny_open']
+        days = {col: self.daily_data[col].to_numpy() for col in cols}
+        # Dates keep their (tz-aware) datetime array rather than objects
+        dates = self.daily_data['date'].array
+
+        # Look up each day's variant in the probability map (first match)
+        lookup = self.prob_index.reindex(days['variant'])
+        n = lookup['n'].to_numpy()
+        p_high = lookup['first_high_pct'].to_numpy()
+
+        # Days without a first sweep have no outcome; reliability filters
+        # (n < 50 is 'Low'), then entry thresholds
+        tradable = pd.notna(days['first_sweep_side']) & (n >= MIN_SAMPLE_SIZE) & (n >= 50)
+        is_long = tradable & (p_high >= ENTRY_THRESHOLD_HIGH)
+        is_short = tradable & (p_high <= ENTRY_THRESHOLD_LOW)
+        entered = np.flatnonzero(is_long | is_short)
+
+        days = {col: values[entered] for col, values in days.items()}
+        is_long = is_long[entered]
+
+        result = compute_trade_outcomes(is_long, days['first_sweep_side'], days['both_flag'],
+                                        days['london_high'], days['london_low'], days['ny_open'])
+
+        # One column per trade field (no per-trade objects)
+        self.trades_df = pd.DataFrame({
+            'date': dates[entered],
+            'direction': pd.Categorical(np.where(is_long, 'long', 'short'),
+                                        categories=['long', 'short']),
+            'entry': days['ny_open'],
+            'exit': result['exit_price'],
+            'points': result['points'],
+            'pnl_gross': result['pnl_gross'],
+            'pnl_net': result['pnl_net'],
+            'outcome': pd.Categorical(np.where(result['win'], 'win', 'loss'),
+                                      categories=['win', 'loss']),
+            'variant': pd.Categorical(days['variant']),
+            'probability': p_high[entered],
+            'sample_size': n[entered]
+        })
+
+        # Track equity
+        cumulative_pnl = np.cumsum(result['pnl_net'])
+        self.equity_curve = pd.DataFrame({
+            'date': dates[entered],
+            'pnl': result['pnl_net'],
+            'cumulative_pnl': cumulative_pnl,
+            'equity': self.initial_capital + cumulative_pnl
+        })
+
+        print(f"\n✓ Backtest complete: {len(self.trades_df)} trades executed")
 
     def calculate_statistics(self):
         """Calculate comprehensive performance statistics."""
-        if len(self.trades) == 0:
+        if len(self.trades_df) == 0:
             print("\n⚠ No trades executed")
             return {}
 
-        # Convert trades to DataFrame for analysis
-        trade_data = []
-        for t in self.trades:
-            trade_data.append({
-                'date': t.date,
-                'direction': t.direction,
-                'entry': t.entry_price,
-                'exit': t.exit_price,
-                'points': t.points,
-                'pnl_gross': t.pnl_gross,
-                'pnl_net': t.pnl_net,
-                'outcome': t.outcome,
-                'variant': t.variant,
-                'probability': t.probability,
-                'sample_size': t.sample_size
-            })
-
-        trades_df = pd.DataFrame(trade_data)
+        trades_df = self.trades_df
+
+        # Column arrays and outcome/direction masks, computed once and shared
+        # by every statistic below instead of re-filtering the frame
+        pnl_net = trades_df['pnl_net'].to_numpy()
+        is_win = (trades_df['outcome'] == 'win').to_numpy()
+        is_loss = (trades_df['outcome'] == 'loss').to_numpy()
+        is_long = (trades_df['direction'] == 'long').to_numpy()
+        is_short = (trades_df['direction'] == 'short').to_numpy()
 
         # Basic statistics
         total_trades = len(trades_df)
-        winning_trades = len(trades_df[trades_df['outcome'] == 'win'])
-        losing_trades = len(trades_df[trades_df['outcome'] == 'loss'])
+        winning_trades = int(np.count_nonzero(is_win))
+        losing_trades = int(np.count_nonzero(is_loss))
 
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
 
         # P&L statistics
-        total_pnl_net = trades_df['pnl_net'].sum()
+        total_pnl_net = pnl_net.sum()
         total_pnl_gross = trades_df['pnl_gross'].sum()
         total_commissions = total_pnl_gross - total_pnl_net
 
-        avg_win = trades_df[trades_df['outcome'] == 'win']['pnl_net'].mean() if winning_trades > 0 else 0
-        avg_loss = trades_df[trades_df['outcome'] == 'loss']['pnl_net'].mean() if losing_trades > 0 else 0
+        avg_win = pnl_net[is_win].mean() if winning_trades > 0 else 0
+        avg_loss = pnl_net[is_loss].mean() if losing_trades > 0 else 0
 
-        largest_win = trades_df['pnl_net'].max()
-        largest_loss = trades_df['pnl_net'].min()
+        largest_win = pnl_net.max()
+        largest_loss = pnl_net.min()
 
         # Profit factor
-        gross_profit = trades_df[trades_df['pnl_net'] > 0]['pnl_net'].sum()
-        gross_loss = abs(trades_df[trades_df['pnl_net'] < 0]['pnl_net'].sum())
+        gross_profit = pnl_net[pnl_net > 0].sum()
+        gross_loss = abs(pnl_net[pnl_net < 0].sum())
         profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else float('inf')
 
         # Drawdown calculation
-        equity_df = pd.DataFrame(self.equity_curve)
-        equity_df['peak'] = equity_df['equity'].cummax()
-        equity_df['drawdown'] = equity_df['equity'] - equity_df['peak']
-        equity_df['drawdown_pct'] = (equity_df['drawdown'] / equity_df['peak'] * 100)
+        equity = self.equity_curve['equity'].to_numpy()
+        peak = np.maximum.accumulate(equity)
+        drawdown = equity - peak
+        drawdown_pct = drawdown / peak * 100
+
+        equity_df = self.equity_curve.assign(peak=peak, drawdown=drawdown,
+                                             drawdown_pct=drawdown_pct)
 
-        max_drawdown = equity_df['drawdown'].min()
-        max_drawdown_pct = equity_df['drawdown_pct'].min()
+        max_drawdown = drawdown.min()
+        max_drawdown_pct = drawdown_pct.min()
 
         # Points statistics
         avg_points = trades_df['points'].mean()
 
         # Direction breakdown
-        long_trades = len(trades_df[trades_df['direction'] == 'long'])
-        short_trades = len(trades_df[trades_df['direction'] == 'short'])
-        long_win_rate = (len(trades_df[(trades_df['direction'] == 'long') & (trades_df['outcome'] == 'win')]) / long_trades * 100) if long_trades > 0 else 0
-        short_win_rate = (len(trades_df[(trades_df['direction'] == 'short') & (trades_df['outcome'] == 'win')]) / short_trades * 100) if short_trades > 0 else 0
+        long_trades = int(np.count_nonzero(is_long))
+        short_trades = int(np.count_nonzero(is_short))
+        long_win_rate = (np.count_nonzero(is_long & is_win) / long_trades * 100) if long_trades > 0 else 0
+        short_win_rate = (np.count_nonzero(is_short & is_win) / short_trades * 100) if short_trades > 0 else 0
 
         # Time period
         date_range = f"{trades_df['date'].min()} to {trades_df['date'].max()}"
@@ -348,31 +288,33 @@ class BacktestEngine:
 
         # Top performing variants
         print(f"\n🏆 Top 10 Variants by P&L:")
-        variant_pnl = trades_df.groupby('variant')['pnl_net'].agg(['sum', 'count', 'mean']).sort_values('sum', ascending=False)
-        for i, (variant, row) in enumerate(variant_pnl.head(10).iterrows(), 1):
+        variant_pnl = trades_df.groupby('variant', observed=True)['pnl_net'].agg(['sum', 'count', 'mean'])
+        top = variant_pnl.nlargest(10, 'sum')
+        for i, (variant, total, count, mean) in enumerate(
+                zip(top.index, top['sum'].to_numpy(), top['count'].to_numpy(), top['mean'].to_numpy()), 1):
             print(f"  {i}. {variant}")
-            print(f"     Trades: {int(row['count'])}, Total P&L: ${row['sum']:,.2f}, Avg: ${row['mean']:.2f}")
+            print(f"     Trades: {int(count)}, Total P&L: ${total:,.2f}, Avg: ${mean:.2f}")
 
-        # Worst performing variants
+        # Worst performing variants (listed from highest to lowest P&L)
         print(f"\n❌ Bottom 5 Variants by P&L:")
-        for i, (variant, row) in enumerate(variant_pnl.tail(5).iterrows(), 1):
+        bottom = variant_pnl.nsmallest(5, 'sum').iloc[::-1]
+        for i, (variant, total, count, mean) in enumerate(
+                zip(bottom.index, bottom['sum'].to_numpy(), bottom['count'].to_numpy(), bottom['mean'].to_numpy()), 1):
             print(f"  {i}. {variant}")
-            print(f"     Trades: {int(row['count'])}, Total P&L: ${row['sum']:,.2f}, Avg: ${row['mean']:.2f}")
+            print(f"     Trades: {int(count)}, Total P&L: ${total:,.2f}, Avg: ${mean:.2f}")
 
         # Monthly/Yearly breakdown
-        try:
-            trades_df_copy = trades_df.copy()
-            trades_df_copy['date'] = pd.to_datetime(trades_df_copy['date'], errors='coerce')
-            trades_df_copy['year'] = trades_df_copy['date'].dt.year
-            yearly_pnl = trades_df_copy.groupby('year')['pnl_net'].sum()
-
-            print(f"\n📅 Yearly P&L:")
-            for year, pnl in yearly_pnl.items():
-                print(f"  {year}: ${pnl:,.2f}")
-        except Exception as e:
-            print(f"\n⚠ Could not generate yearly breakdown: {e}")
-
-        # Export results
+        # Dates are parsed once at load, so no copy or re-parse here
+        yearly_pnl = trades_df.groupby(trades_df['date'].dt.year)['pnl_net'].sum()
+
+        print(f"\n📅 Yearly P&L:")
+        for year, pnl in yearly_pnl.items():
+            print(f"  {year}: ${pnl:,.2f}")
+
+        # Export results. These stay on pandas' writer: pyarrow.csv prints
+        # doubles with 16 significant digits (P&L values would not round-trip)
+        # and quotes every string field, and at one row per trade the write
+        # is not a bottleneck
         trades_df.to_csv('output/backtest_trades.csv', index=False)
         equity_df.to_csv('output/backtest_equity_curve.csv', index=False)
 
@@ -400,8 +342,22 @@ def main():
     # Load data
     print("\nLoading data...")
     daily_data = pd.read_csv('output/daily_sessions_with_labels.csv')
+    # Parse dates once. The file mixes -05:00/-04:00 offsets, so parse as UTC
+    # and convert back to New York time (same text when exported)
+    daily_data['date'] = pd.to_datetime(daily_data['date'], utc=True).dt.tz_convert('America/New_York')
     prob_map = pd.read_csv('output/ny_probability_map.csv')
 
+    # Low-cardinality strings as categoricals, so comparisons and groupbys
+    # work on integer codes
+    for col in ['variant', 'first_sweep_side']:
+        daily_data[col] = daily_data[col].astype('category')
+
+    # Narrow dtypes where no precision is lost: 0/1 flags as bool, sample
+    # counts as int32 and percentages (two decimals) as float32. Prices stay
+    # float64 so P&L arithmetic is unchanged
+    daily_data = daily_data.astype({'both_flag': 'bool', 'fail_flag': 'bool'})
+    prob_map = prob_map.astype({'n': 'int32', 'first_high_pct': 'float32'})
+
     print(f"  Daily data: {len(daily_data):,} rows")
     print(f"  Probability map: {len(prob_map)} variants")
 
@@ -5,57 +5,165 @@ TradingView PineScript v5 Generator (With Fixed Lines)
 Lines now stay fixed at price levels during NY session.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import heapq
 import json
+import os
+from operator import itemgetter
+import numpy as np
 import pandas as pd
 
-def load_probability_map(filepath='ny_probability_map.json'):
-    """Load the probability map from JSON."""
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib json parser
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional: fall back to loading the whole map
+    ijson = None
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # optional: read the JSON map instead of its Parquet copy
+    pyarrow = None
+
+# Factor vocabularies. Each variant has a fixed slot,
+# ((regime * 4 + sweep) * 3 + transition) * 3 + ny_open, so the indicator
+# finds it with integer arithmetic instead of scanning variant strings; a
+# slot-indexed table maps it to its row in the dense per-variant arrays.
+ASIA_REGIMES = ['Compressed', 'Normal', 'Expanded']
+LONDON_SWEEPS = ['None', 'High', 'Low', 'Both']
+OPEN_POSITIONS = ['Above', 'Below', 'Within']
+VARIANT_SLOTS = len(ASIA_REGIMES) * len(LONDON_SWEEPS) * len(OPEN_POSITIONS) ** 2
+SLOTS_PER_LINE = len(OPEN_POSITIONS) ** 2
+
+# Reliability tags, emitted as codes indexing reliability_names
+RELIABILITY_LEVELS = ['High', 'Medium', 'Low']
+
+# Element formats for the embedded numeric arrays, applied to whole arrays
+# with np.char.mod. Percentages keep the map's two decimals, so the
+# p_low = 100 - p_high the indicator derives is exact and only rounded once
+# for display ("#.#"); penetrations keep one decimal, all that is shown.
+# Fixed-point keeps the decimal point so Pine still infers float arrays
+INT_FORMAT = '%d'
+PCT_FORMAT = '%.2f'
+PEN_FORMAT = '%.1f'
+
+# Factor names are quoted string literals, through the bound str.format
+NAME_FORMAT = '"{}"'
+
+# Probability map fields embedded in the indicator
+VARIANT_FIELDS = ['variant', 'n', 'first_high_pct', 'fail_pct',
+                  'median_pen_high', 'median_pen_low', 'reliability']
+
+def encode_variant(variant):
+    """Return the slot index of a 'Regime|Sweep|Transition|NYOpen' variant."""
+    regime, sweep, transition, ny_open = variant.split('|')
+    slot = ASIA_REGIMES.index(regime)
+    slot = slot * len(LONDON_SWEEPS) + LONDON_SWEEPS.index(sweep)
+    slot = slot * len(OPEN_POSITIONS) + OPEN_POSITIONS.index(transition)
+    slot = slot * len(OPEN_POSITIONS) + OPEN_POSITIONS.index(ny_open)
+    return slot
+
+def wrap_array_items(items):
+    """
+    Join formatted array items, SLOTS_PER_LINE to a line (one line per
+    (regime, sweep) pair for slot-indexed arrays).
+
+    Continuation lines are indented by 5 spaces, which Pine reads as a
+    wrapped line rather than a new block.
+    """
+    return ',\n     '.join(','.join(items[i:i + SLOTS_PER_LINE])
+                             for i in range(0, len(items), SLOTS_PER_LINE))
+
+def stream_top_variants(filepath, top_n):
+    """
+    Stream the probability map with ijson, keeping only the top_n variants
+    by sample size in a bounded heap.
+
+    Returns:
+        (top variants, total variant count)
+    """
+    heap = []
+    count = 0
+    with open(filepath, 'rb') as f:
+        for variant in ijson.items(f, 'item', use_float=True):
+            # -count keeps the earlier variant first on equal n, as a
+            # stable descending sort would
+            entry = (variant['n'], -count, variant)
+            if len(heap) < top_n:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+            count += 1
+
+    return [variant for _, _, variant in sorted(heap, reverse=True)], count
+
+def preferred_input(filepath):
+    """
+    Return the Parquet copy run_analysis.py writes next to filepath when it
+    can be read and is at least as new (or filepath was not written),
+    otherwise filepath itself.
+    """
+    parquet_path = os.path.splitext(filepath)[0] + '.parquet'
+    if (pyarrow is not None and os.path.exists(parquet_path)
+            and (not os.path.exists(filepath)
+                 or os.path.getmtime(parquet_path) >= os.path.getmtime(filepath))):
+        return parquet_path
+    return filepath
+
+def load_probability_map(filepath='ny_probability_map.json', top_n=None):
+    """
+    Load the probability map, from its Parquet copy when that is current
+    and from JSON otherwise.
+
+    With top_n set and ijson installed, the JSON file is streamed and only
+    the top_n variants by sample size are kept.
+    """
     print("="*80)
     print("LOADING PROBABILITY MAP")
     print("="*80)
 
-    with open(filepath, 'r') as f:
-        prob_map = json.load(f)
+    filepath = preferred_input(filepath)
+    if filepath.endswith('.parquet'):
+        # Only the embedded fields are read; records are zipped from the
+        # columns, in file order like the JSON list
+        pm = pd.read_parquet(filepath, columns=VARIANT_FIELDS)
+        prob_map = [dict(zip(VARIANT_FIELDS, row)) for row in
+                    zip(*(pm[col].tolist() for col in VARIANT_FIELDS))]
+        print(f"\nLoaded {len(prob_map)} variants")
+        return prob_map
+
+    if top_n is not None and ijson is not None:
+        prob_map, count = stream_top_variants(filepath, top_n)
+        print(f"\nLoaded {count} variants (kept top {len(prob_map)})")
+        return prob_map
+
+    with open(filepath, 'rb') as f:
+        data = f.read()
+
+    # run_analysis.py writes missing medians as null with either writer,
+    # so the map is valid JSON for orjson
+    prob_map = orjson.loads(data) if orjson is not None else json.loads(data)
 
     print(f"\nLoaded {len(prob_map)} variants")
     return prob_map
 
 def filter_top_variants(prob_map, top_n=25):
     """Filter to only the most reliable variants."""
-    sorted_variants = sorted(prob_map, key=lambda x: x['n'], reverse=True)
-    top_variants = sorted_variants[:top_n]
+    # Bounded heap: O(N log top_n), same order as a stable descending sort
+    top_variants = heapq.nlargest(top_n, prob_map, key=itemgetter('n'))
 
     print(f"\nFiltered to top {len(top_variants)} variants by sample size")
     print(f"Sample size range: {top_variants[0]['n']} to {top_variants[-1]['n']}")
 
     return top_variants
 
-def generate_pinescript(prob_map, output_file='NY_Probability_Map.pine'):
-    """Generate the complete PineScript v5 indicator."""
-    print("\n" + "="*80)
-    print("GENERATING PINESCRIPT V5 INDICATOR")
-    print("="*80)
-
-    top_variants = filter_top_variants(prob_map, top_n=25)
-
-    # Build variant data
-    variant_strings = []
-    variant_n = []
-    variant_p_high = []
-    variant_p_fail = []
-    variant_pen_high = []
-    variant_pen_low = []
-
-    for v in top_variants:
-        variant_strings.append(v['variant'])
-        variant_n.append(v['n'])
-        variant_p_high.append(v['first_high_pct'])
-        variant_p_fail.append(v['fail_pct'])
-        variant_pen_high.append(v['median_pen_high'] if v['median_pen_high'] is not None else 0.0)
-        variant_pen_low.append(v['median_pen_low'] if v['median_pen_low'] is not None else 0.0)
-
-    pine_script = '''// This source code is subject to the terms of the Mozilla Public License 2.0 at https://mozilla.org/MPL/2.0/
-// © NY Probability Map - Top 25 Variants
+# Indicator source around the embedded numeric arrays, filled in with
+# str.format
+PINE_HEADER_TEMPLATE = '''// This source code is subject to the terms of the Mozilla Public License 2.0 at https://mozilla.org/MPL/2.0/
+// © NY Probability Map - Top {top_n} Variants
 
 //@version=5
 indicator("NY Probability Map", overlay=true, max_boxes_count=500, max_labels_count=500)
@@ -83,31 +191,23 @@ is_asia = not na(time(timeframe.period, "1600-0200:1234567", "America/New_York")
 is_london = not na(time(timeframe.period, "0200-0800:12345", "America/New_York"))
 is_ny = not na(time(timeframe.period, "0800-1600:12345", "America/New_York"))
 
+// Session transition, evaluated once per bar and reused below
+ny_start = is_ny and not is_ny[1]
+
 // ============================================================================
-// VARIANT DATABASE (TOP 25)
+// VARIANT DATABASE (TOP {top_n})
 // ============================================================================
 
-var int DB_SIZE = ''' + str(len(variant_strings)) + '''
+// Slot = ((regime * 4 + sweep) * 3 + transition) * 3 + ny_open
+// db_row maps each slot to its row in the db_* arrays (-1 = not in the top {top_n})
+var string[] regime_names = array.from({regime_names})
+var string[] sweep_names = array.from({sweep_names})
+var string[] position_names = array.from({position_names})
+var string[] reliability_names = array.from({reliability_names})
 
-var string[] db_variant = array.from('''
-
-    # Add variants
-    chunk_size = 5
-    for i in range(0, len(variant_strings), chunk_size):
-        chunk = variant_strings[i:i+chunk_size]
-        if i > 0:
-            pine_script += ',\n     '
-        pine_script += ', '.join([f'"{v}"' for v in chunk])
-
-    pine_script += ')\n\n'
-
-    # Add numeric arrays
-    pine_script += f'''var int[] db_n = array.from({', '.join(map(str, variant_n))})
-var float[] db_p_high = array.from({', '.join(f'{x:.2f}' for x in variant_p_high)})
-var float[] db_p_fail = array.from({', '.join(f'{x:.2f}' for x in variant_p_fail)})
-var float[] db_pen_high = array.from({', '.join(f'{x:.2f}' for x in variant_pen_high)})
-var float[] db_pen_low = array.from({', '.join(f'{x:.2f}' for x in variant_pen_low)})
+'''
 
+PINE_BODY_TEMPLATE = '''
 // ============================================================================
 // STATE VARIABLES
 // ============================================================================
@@ -123,7 +223,12 @@ var float trans_open = na
 var float ny_open = na
 var string current_variant = ""
 var int variant_idx = -1
+var string current_reliability = ""
+var color current_rel_color = na
 var float[] asia_history = array.new_float()
+var float[] asia_sorted = array.new_float()
+var float asia_q33 = na
+var float asia_q66 = na
 
 var bool asia_started = false
 var bool london_started = false
@@ -135,33 +240,19 @@ var string debug_msg = ""
 // HELPER FUNCTIONS
 // ============================================================================
 
+// Factor codes index regime_names / sweep_names / position_names
+// Thresholds are cached when the Asia history changes (once per day)
 f_asia_regime(range_val) =>
-    result = "Normal"
-    if array.size(asia_history) >= 50
-        sorted = array.copy(asia_history)
-        array.sort(sorted)
-        size = array.size(sorted)
-        q33 = array.get(sorted, math.floor(size * 0.33))
-        q66 = array.get(sorted, math.floor(size * 0.66))
-        result := range_val < q33 ? "Compressed" : range_val > q66 ? "Expanded" : "Normal"
-    result
+    na(asia_q33) ? 1 : range_val < asia_q33 ? 0 : range_val > asia_q66 ? 2 : 1
 
 f_london_sweep(lh, ll, ah, al) =>
     swept_h = lh > ah
     swept_l = ll < al
-    swept_h and swept_l ? "Both" : swept_h ? "High" : swept_l ? "Low" : "None"
+    swept_h and swept_l ? 3 : swept_h ? 1 : swept_l ? 2 : 0
 
 f_open_vs_london(open_price, lm, lr) =>
     tol = lr * 0.25
-    open_price > lm + tol ? "Above" : open_price < lm - tol ? "Below" : "Within"
-
-f_find_variant(var_str) =>
-    idx = -1
-    for i = 0 to DB_SIZE - 1
-        if array.get(db_variant, i) == var_str
-            idx := i
-            break
-    idx
+    open_price > lm + tol ? 0 : open_price < lm - tol ? 1 : 2
 
 // ============================================================================
 // SESSION TRACKING
@@ -181,6 +272,8 @@ if new_day
     ny_open := na
     current_variant := ""
     variant_idx := -1
+    current_reliability := ""
+    current_rel_color := na
     asia_started := false
     london_started := false
     ny_started := false
@@ -195,9 +288,17 @@ if is_asia
 if not is_asia and asia_started and na(asia_r)
     asia_r := asia_h - asia_l
     if not na(asia_r) and asia_r > 0
+        // asia_sorted mirrors asia_history in ascending order, so the
+        // quantiles are plain lookups instead of a copy + sort
         array.push(asia_history, asia_r)
+        array.insert(asia_sorted, array.binary_search_rightmost(asia_sorted, asia_r), asia_r)
         if array.size(asia_history) > asia_range_window
-            array.shift(asia_history)
+            shifted = array.shift(asia_history)
+            array.remove(asia_sorted, array.binary_search_leftmost(asia_sorted, shifted))
+        size = array.size(asia_sorted)
+        if size >= 50
+            asia_q33 := array.get(asia_sorted, math.floor(size * 0.33))
+            asia_q66 := array.get(asia_sorted, math.floor(size * 0.66))
 
 // Track London
 if is_london
@@ -212,7 +313,7 @@ if not is_london and london_started and na(london_m)
         trans_open := open  // Capture price at handoff (08:00)
 
 // NY open - calculate variant
-if is_ny and not is_ny[1] and na(ny_open)
+if ny_start and na(ny_open)
     ny_started := true
     ny_open := open
 
@@ -231,11 +332,18 @@ if is_ny and not is_ny[1] and na(ny_open)
         trans_vs_london = f_open_vs_london(trans_open, london_m, london_r)
         ny_vs_london = f_open_vs_london(ny_open, london_m, london_r)
 
-        current_variant := asia_regime + "|" + london_sweep + "|" + trans_vs_london + "|" + ny_vs_london
-        variant_idx := f_find_variant(current_variant)
+        current_variant := array.get(regime_names, asia_regime) + "|" + array.get(sweep_names, london_sweep) + "|" + array.get(position_names, trans_vs_london) + "|" + array.get(position_names, ny_vs_london)
+        slot = ((asia_regime * 4 + london_sweep) * 3 + trans_vs_london) * 3 + ny_vs_london
+        variant_idx := array.get(db_row, slot)
+        if variant_idx >= 0
+            // Reliability only changes with the variant, so it is set here
+            // once instead of on every NY bar of the table
+            rel = array.get(db_rel, variant_idx)
+            current_reliability := array.get(reliability_names, rel)
+            current_rel_color := rel == 0 ? color.green : rel == 1 ? color.orange : color.red
 
         debug_msg := debug_msg + "\\nVariant: " + current_variant + "\\n"
-        debug_msg := debug_msg + "Found: " + (variant_idx >= 0 ? "YES (idx=" + str.tostring(variant_idx) + ")" : "NO - Not in Top 25")
+        debug_msg := debug_msg + "Found: " + (variant_idx >= 0 ? "YES (idx=" + str.tostring(variant_idx) + ")" : "NO - Not in Top {top_n}")
     else
         debug_msg := debug_msg + "\\nERROR: Missing required data!"
 
@@ -257,7 +365,7 @@ bgcolor(is_london ? color.new(color.orange, 95) : na, title="London Session")
 bgcolor(is_ny ? color.new(color.green, 95) : na, title="NY Session")
 
 // Debug label at NY open
-if show_debug and is_ny and not is_ny[1]
+if show_debug and ny_start
     label.new(bar_index, high, debug_msg,
               style=label.style_label_down,
               color=color.blue,
@@ -280,9 +388,6 @@ if show_prob_table and is_ny
         pen_h = array.get(db_pen_high, variant_idx)
         pen_l = array.get(db_pen_low, variant_idx)
 
-        reliability = n >= 150 ? "High" : n >= 50 ? "Medium" : "Low"
-        rel_color = n >= 150 ? color.green : n >= 50 ? color.orange : color.red
-
         // Parse variant components
         variant_parts = str.split(current_variant, "|")
         asia_regime = array.size(variant_parts) > 0 ? array.get(variant_parts, 0) : "Unknown"
@@ -309,7 +414,7 @@ if show_prob_table and is_ny
         table.cell(info_table, 1, 5, str.tostring(n), bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.small)
 
         table.cell(info_table, 0, 6, "Reliability:", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.small)
-        table.cell(info_table, 1, 6, reliability, bgcolor=color.new(color.gray, 90), text_color=rel_color, text_size=size.small)
+        table.cell(info_table, 1, 6, current_reliability, bgcolor=color.new(color.gray, 90), text_color=current_rel_color, text_size=size.small)
 
         // Separator
         table.cell(info_table, 0, 7, "─────────────", bgcolor=color.new(color.gray, 95), text_color=color.gray, text_size=size.tiny)
@@ -352,13 +457,13 @@ if show_prob_table and is_ny
 
         if current_variant != ""
             table.cell(info_table, 0, 1, "Status:", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.small)
-            table.cell(info_table, 1, 1, "Variant Not in Top 25", bgcolor=color.new(color.orange, 90), text_color=color.white, text_size=size.small)
+            table.cell(info_table, 1, 1, "Variant Not in Top {top_n}", bgcolor=color.new(color.orange, 90), text_color=color.white, text_size=size.small)
 
             table.cell(info_table, 0, 2, "Variant:", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.tiny)
             table.cell(info_table, 1, 2, current_variant, bgcolor=color.new(color.gray, 90), text_color=color.yellow, text_size=size.tiny)
 
             table.cell(info_table, 0, 3, "Note:", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.tiny)
-            table.cell(info_table, 1, 3, "This setup has <31 samples", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.tiny)
+            table.cell(info_table, 1, 3, "This setup has <{min_n} samples", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.tiny)
         else
             table.cell(info_table, 0, 1, "Status:", bgcolor=color.new(color.gray, 90), text_color=color.white, text_size=size.small)
             table.cell(info_table, 1, 1, "Missing Data", bgcolor=color.new(color.red, 90), text_color=color.white, text_size=size.small)
@@ -372,13 +477,99 @@ else if not is_ny and show_prob_table
     table.merge_cells(info_table, 0, 0, 1, 0)
 '''
 
-    with open(output_file, 'w') as f:
-        f.write(pine_script)
+def generate_pinescript(prob_map, output_file='NY_Probability_Map.pine', top_n=25):
+    """Generate the complete PineScript v5 indicator."""
+    print("\n" + "="*80)
+    print("GENERATING PINESCRIPT V5 INDICATOR")
+    print("="*80)
+
+    top_variants = filter_top_variants(prob_map, top_n=top_n)
+
+    # Build variant data column-wise, keeping only the fields the indicator
+    # embeds; itemgetter pulls each row's fields as one C-level tuple
+    pm = pd.DataFrame.from_records(map(itemgetter(*VARIANT_FIELDS), top_variants),
+                                   columns=VARIANT_FIELDS)
+    pm = pm.fillna({'median_pen_high': 0.0, 'median_pen_low': 0.0})
+
+    # Slot -> row table (-1 when the variant is not in the top N), so the
+    # per-variant arrays only hold the top N rows
+    variant_row = np.full(VARIANT_SLOTS, -1, dtype=np.int64)
+    variant_row[pm['variant'].map(encode_variant).to_numpy()] = np.arange(len(pm))
+    variant_rel = pd.Categorical(pm['reliability'], categories=RELIABILITY_LEVELS,
+                                 ordered=True).codes
+
+    header = PINE_HEADER_TEMPLATE.format(
+        top_n=top_n,
+        regime_names=', '.join(map(NAME_FORMAT.format, ASIA_REGIMES)),
+        sweep_names=', '.join(map(NAME_FORMAT.format, LONDON_SWEEPS)),
+        position_names=', '.join(map(NAME_FORMAT.format, OPEN_POSITIONS)),
+        reliability_names=', '.join(map(NAME_FORMAT.format, RELIABILITY_LEVELS)),
+    )
+
+    body = PINE_BODY_TEMPLATE.format(top_n=top_n, min_n=top_variants[-1]['n'])
+
+    # Numeric arrays: (Pine type, name, values, element format)
+    fields = [
+        ('int', 'db_row', variant_row, INT_FORMAT),
+        ('int', 'db_n', pm['n'].to_numpy(), INT_FORMAT),
+        ('float', 'db_p_high', pm['first_high_pct'].to_numpy(), PCT_FORMAT),
+        ('float', 'db_p_fail', pm['fail_pct'].to_numpy(), PCT_FORMAT),
+        ('float', 'db_pen_high', pm['median_pen_high'].to_numpy(), PEN_FORMAT),
+        ('float', 'db_pen_low', pm['median_pen_low'].to_numpy(), PEN_FORMAT),
+        ('int', 'db_rel', variant_rel, INT_FORMAT),
+    ]
+
+    # Write each section straight through a 64 KB buffer as it is built;
+    # the size on disk comes from the final file position
+    lines = 0
+    with open(output_file, 'w', buffering=1 << 16) as f:
+        f.write(header)
+        lines += header.count('\n')
+        for pine_type, name, values, fmt in fields:
+            f.write(f"var {pine_type}[] {name} = array.from(")
+            chunk = wrap_array_items(np.char.mod(fmt, values).tolist())
+            f.write(chunk)
+            f.write(")\n")
+            lines += chunk.count('\n') + 1
+        f.write(body)
+        lines += body.count('\n')
+        size = f.tell()
 
     print(f"\n✓ PineScript generated: {output_file}")
     print(f"  Variants: {len(top_variants)}")
-    print(f"  Lines: {len(pine_script.splitlines())}")
-    print(f"  Size: {len(pine_script) / 1024:.2f} KB")
+    print(f"  Lines: {lines}")
+    print(f"  Size: {size / 1024:.2f} KB")
+
+# Probability map shared by generate_many workers, set once per process by
+# the pool initializer instead of being pickled with every task
+worker_prob_map = None
+
+def init_worker(prob_map):
+    """Pool initializer: keep the probability map in the worker process."""
+    global worker_prob_map
+    worker_prob_map = prob_map
+
+def generate_from_config(config):
+    """Generate one indicator from an (output_file, top_n) config."""
+    output_file, top_n = config
+    generate_pinescript(worker_prob_map, output_file, top_n)
+    return output_file
+
+def generate_many(prob_map, configs, max_workers=None):
+    """
+    Generate several indicators in parallel, one per config.
+
+    Args:
+        prob_map: Probability map (list of variant dicts)
+        configs: Iterable of (output_file, top_n) pairs
+        max_workers: Process count (defaults to the CPU count)
+
+    Returns:
+        List of the generated output files
+    """
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(prob_map,)) as executor:
+        return list(executor.map(generate_from_config, configs))
 
 def main():
     """Main execution."""
@@ -386,7 +577,7 @@ def main():
     print("PINESCRIPT GENERATOR - FIXED LINES VERSION")
     print("="*80)
 
-    prob_map = load_probability_map()
+    prob_map = load_probability_map(top_n=25)
     generate_pinescript(prob_map)
 
     print("\n" + "="*80)
@@ -8,9 +8,17 @@ Splits data into three eras and checks for probability drift across time periods
 import pandas as pd
 import numpy as np
 import json
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # optional: without a Parquet engine nothing is cached
+    pyarrow = None
+
 # Define eras
 ERAS = {
     'Era 1 (2016-2018)': ('2016-01-01', '2018-12-31'),
@@ -20,13 +28,35 @@ ERAS = {
 
 DRIFT_THRESHOLD = 15.0  # Flag variants with >15% drift in key probabilities
 
+CACHE_DIR = 'cache'  # Per-era probabilities, keyed by input file + era bounds
+
+def preferred_input(filepath):
+    """
+    Return the Parquet copy run_analysis.py writes next to filepath when it
+    can be read and is at least as new (or filepath was not written),
+    otherwise filepath itself.
+    """
+    parquet_path = os.path.splitext(filepath)[0] + '.parquet'
+    if (pyarrow is not None and os.path.exists(parquet_path)
+            and (not os.path.exists(filepath)
+                 or os.path.getmtime(parquet_path) >= os.path.getmtime(filepath))):
+        return parquet_path
+    return filepath
+
 def load_daily_data(filepath='daily_sessions_with_labels.csv'):
-    """Load the daily sessions data with labels."""
+    """Load the daily sessions data with labels (CSV or Parquet)."""
     print("="*80)
     print("LOADING DAILY DATA")
     print("="*80)
 
-    df = pd.read_csv(filepath)
+    if filepath.endswith('.parquet'):
+        df = pd.read_parquet(filepath)
+        # Factor columns come back as categories; the era tables are built
+        # on plain strings, as when reading the CSV
+        categories = df.select_dtypes('category').columns
+        df[categories] = df[categories].astype(object)
+    else:
+        df = pd.read_csv(filepath)
     df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None)  # Remove timezone
     print(f"\nLoaded {len(df):,} trading days")
     print(f"Date range: {df['date'].min()} to {df['date'].max()}")
@@ -57,45 +87,49 @@ def split_data_by_era(df):
 
 def calculate_era_probabilities(df):
     """Calculate probability statistics for a single era."""
-    results = []
-
-    for variant in df['variant'].unique():
-        variant_data = df[df['variant'] == variant]
-        n = len(variant_data)
-
-        if n < 10:  # Skip variants with very few samples
-            continue
-
-        # Calculate probabilities
-        first_high_count = (variant_data['first_sweep_side'] == 'High').sum()
-        first_high_pct = (first_high_count / n * 100) if n > 0 else 0
-
-        sweep_both_pct = variant_data['both_flag'].mean() * 100
-        fail_pct = variant_data['fail_flag'].mean() * 100
-
-        results.append({
-            'variant': variant,
-            'n': n,
-            'first_high_pct': round(first_high_pct, 2),
-            'sweep_both_pct': round(sweep_both_pct, 2),
-            'fail_pct': round(fail_pct, 2)
-        })
-
-    return pd.DataFrame(results)
-
-def analyze_all_eras(era_data):
-    """Analyze probabilities for each era."""
+    # One groupby pass over the era instead of a boolean mask per variant;
+    # sort=False keeps variants in order of first appearance
+    grouped = df.assign(high_first=(df['first_sweep_side'] == 'High')).groupby('variant', sort=False)
+    results = grouped.agg(
+        n=('variant', 'size'),
+        first_high_pct=('high_first', 'mean'),
+        sweep_both_pct=('both_flag', 'mean'),
+        fail_pct=('fail_flag', 'mean')
+    ).reset_index()
+
+    # Skip variants with very few samples
+    results = results[results['n'] >= 10].reset_index(drop=True)
+
+    pct_cols = ['first_high_pct', 'sweep_both_pct', 'fail_pct']
+    results[pct_cols] = (results[pct_cols] * 100).round(2)
+
+    return results
+
+def analyze_all_eras(era_data, max_workers=None):
+    """
+    Analyze probabilities for each era.
+
+    The eras are disjoint slices, so each one is analyzed in a worker
+    process (max_workers defaults to one per era, capped at the CPU count).
+    """
     print("\n" + "="*80)
     print("ANALYZING PROBABILITIES BY ERA")
     print("="*80)
 
     era_results = {}
 
-    for era_name, era_df in era_data.items():
-        print(f"\n{era_name}...")
-        era_probs = calculate_era_probabilities(era_df)
-        era_results[era_name] = era_probs
-        print(f"  Variants analyzed: {len(era_probs)}")
+    if max_workers is None:
+        max_workers = min(len(era_data), os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {era_name: executor.submit(calculate_era_probabilities, era_df)
+                   for era_name, era_df in era_data.items()}
+
+        for era_name, future in futures.items():
+            print(f"\n{era_name}...")
+            era_probs = future.result()
+            era_results[era_name] = era_probs
+            print(f"  Variants analyzed: {len(era_probs)}")
 
     return era_results
 
@@ -117,23 +151,21 @@ def calculate_drift(era_results):
         suffixes=('_era1', '_era3')
     )
 
-    # Calculate drift
-    drift_df['drift_first_high'] = (
-        drift_df['first_high_pct_era3'] - drift_df['first_high_pct_era1']
-    ).abs()
+    # Calculate drift on the aligned NumPy columns (NaN where a variant is
+    # missing from one era)
+    drift_first_high = np.abs(drift_df['first_high_pct_era3'].to_numpy() -
+                              drift_df['first_high_pct_era1'].to_numpy())
+    drift_fail = np.abs(drift_df['fail_pct_era3'].to_numpy() -
+                        drift_df['fail_pct_era1'].to_numpy())
 
-    drift_df['drift_fail'] = (
-        drift_df['fail_pct_era3'] - drift_df['fail_pct_era1']
-    ).abs()
+    drift_df['drift_first_high'] = drift_first_high
+    drift_df['drift_fail'] = drift_fail
 
     # Flag unstable variants
-    drift_df['is_unstable'] = (
-        (drift_df['drift_first_high'] > DRIFT_THRESHOLD) |
-        (drift_df['drift_fail'] > DRIFT_THRESHOLD)
-    )
+    drift_df['is_unstable'] = (drift_first_high > DRIFT_THRESHOLD) | (drift_fail > DRIFT_THRESHOLD)
 
-    # Sort by maximum drift
-    drift_df['max_drift'] = drift_df[['drift_first_high', 'drift_fail']].max(axis=1)
+    # Sort by maximum drift (fmax ignores a NaN side, like max(axis=1))
+    drift_df['max_drift'] = np.fmax(drift_first_high, drift_fail)
     drift_df = drift_df.sort_values('max_drift', ascending=False)
 
     # Filter variants with sufficient data in both eras
@@ -205,35 +237,21 @@ def create_era_comparison_table(era_results, top_n=20):
 
     era_names = list(ERAS.keys())
 
-    # Get all variants that appear in at least one era
-    all_variants = set()
-    for era_probs in era_results.values():
-        all_variants.update(era_probs['variant'].unique())
-
-    comparison_data = []
-
-    for variant in all_variants:
-        row = {'variant': variant}
-
-        # Track total samples across all eras
-        total_samples = 0
-
-        for era_name in era_names:
-            era_probs = era_results[era_name]
-            variant_data = era_probs[era_probs['variant'] == variant]
-
-            if len(variant_data) > 0:
-                row[f'{era_name}_n'] = variant_data['n'].iloc[0]
-                row[f'{era_name}_high_pct'] = variant_data['first_high_pct'].iloc[0]
-                total_samples += variant_data['n'].iloc[0]
-            else:
-                row[f'{era_name}_n'] = 0
-                row[f'{era_name}_high_pct'] = np.nan
-
-        row['total_samples'] = total_samples
-        comparison_data.append(row)
-
-    comparison_df = pd.DataFrame(comparison_data)
+    # Stack the eras and pivot to one row per variant that appears in at
+    # least one era, instead of a filtered lookup per (variant, era)
+    stacked = pd.concat([era_probs.assign(era=era_name)
+                         for era_name, era_probs in era_results.items()])
+    n_by_era = stacked.pivot(index='variant', columns='era', values='n').reindex(columns=era_names)
+    high_by_era = stacked.pivot(index='variant', columns='era',
+                                values='first_high_pct').reindex(columns=era_names)
+
+    comparison_df = pd.DataFrame({'variant': n_by_era.index})
+    for era_name in era_names:
+        comparison_df[f'{era_name}_n'] = n_by_era[era_name].fillna(0).astype('int64').to_numpy()
+        comparison_df[f'{era_name}_high_pct'] = high_by_era[era_name].to_numpy()
+
+    # Track total samples across all eras
+    comparison_df['total_samples'] = comparison_df[[f'{era_name}_n' for era_name in era_names]].sum(axis=1)
     comparison_df = comparison_df.sort_values('total_samples', ascending=False)
 
     # Display top variants
@@ -254,20 +272,58 @@ def create_era_comparison_table(era_results, top_n=20):
     comparison_df.to_csv(comparison_file, index=False)
     print(f"\n✓ Era comparison table saved: {comparison_file}")
 
-def main():
+def era_cache_path(filepath, cache_dir=CACHE_DIR):
+    """Cache file for the per-era probabilities of this input and era split."""
+    digest = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(repr(ERAS).encode())
+    return os.path.join(cache_dir, f'{digest.hexdigest()[:12]}_eras.parquet')
+
+def load_cached_era_results(cache_path):
+    """Load cached per-era probabilities, or None if there is no cache."""
+    if pyarrow is None or not os.path.exists(cache_path):
+        return None
+
+    stacked = pd.read_parquet(cache_path)
+    print(f"\n✓ Loaded cached era probabilities: {cache_path}")
+    return {era_name: stacked[stacked['era'] == era_name].drop(columns='era').reset_index(drop=True)
+            for era_name in ERAS}
+
+def save_era_results(era_results, cache_path):
+    """Cache per-era probabilities as a single Parquet file."""
+    if pyarrow is None:
+        return
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    stacked = pd.concat([era_probs.assign(era=era_name)
+                         for era_name, era_probs in era_results.items()], ignore_index=True)
+    stacked.to_parquet(cache_path, index=False)
+
+def main(filepath='daily_sessions_with_labels.csv'):
     """Main validation workflow."""
     print("\n" + "="*80)
     print("VALIDATION & STABILITY ANALYSIS")
     print("="*80)
 
-    # Load data
-    df = load_daily_data()
+    # Prefer the Parquet copy of the daily data when it is current
+    filepath = preferred_input(filepath)
+
+    # Reuse the per-era probabilities when the input and eras are unchanged
+    cache_path = era_cache_path(filepath)
+    era_results = load_cached_era_results(cache_path)
+
+    if era_results is None:
+        # Load data
+        df = load_daily_data(filepath)
 
-    # Split by era
-    era_data = split_data_by_era(df)
+        # Split by era
+        era_data = split_data_by_era(df)
 
-    # Analyze each era
-    era_results = analyze_all_eras(era_data)
+        # Analyze each era
+        era_results = analyze_all_eras(era_data)
+        save_era_results(era_results, cache_path)
 
     # Calculate drift
     drift_df = calculate_drift(era_results)
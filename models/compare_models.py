@@ -8,9 +8,17 @@ Compares performance metrics across different NY Probability Map model variation
 import pandas as pd
 import json
 import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import numpy as np
 
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'  # multi-threaded parser
+except ImportError:  # optional: fall back to the pandas C parser
+    CSV_ENGINE = 'c'
+
 # Model directories to compare
 MODEL_DIRS = [
     'base_model',
@@ -20,6 +28,72 @@ MODEL_DIRS = [
     'regime_windows'
 ]
 
+# Columns (and their types) the comparison reads from each model's output
+PROB_MAP_DTYPES = {
+    'variant': str,
+    'n': 'int64',
+    'first_high_pct': 'float64',
+    'fail_pct': 'float64',
+    'median_pen_high': 'float64',
+    'median_pen_low': 'float64'
+}
+DRIFT_DTYPES = {
+    'drift_first_high': 'float64',
+    'is_unstable': 'bool'
+}
+
+# Per-model results cache, reused while the output CSVs keep their mtime/size
+RESULTS_CACHE_FILE = '.compare_cache.pkl'
+SOURCE_FILES = ['ny_probability_map.csv', 'validation_drift_report.csv', 'daily_sessions_with_labels.csv']
+
+# Comparison report columns: (column, key in a model's results)
+COMPARISON_COLUMNS = [
+    ('model', 'name'),
+    ('variant_count', 'variant_count'),
+    ('total_days', 'total_days'),
+    ('mean_sample_size', 'mean_sample_size'),
+    ('median_sample_size', 'median_sample_size'),
+    ('high_reliability', 'high_reliability'),
+    ('medium_reliability', 'medium_reliability'),
+    ('low_reliability', 'low_reliability'),
+    ('directional_edge', 'directional_edge'),
+    ('max_edge', 'max_edge'),
+    ('mean_fail_rate', 'mean_fail_rate'),
+    ('stability_rate', 'stability_rate'),
+    ('mean_drift', 'mean_drift_high'),
+    ('median_drift', 'median_drift_high'),
+    ('strong_variants', 'strong_variants'),
+    ('top_variant', 'top_variant_name'),
+    ('top_variant_n', 'top_variant_n'),
+    ('top_variant_p_high', 'top_variant_p_high'),
+]
+
+# Ranked metrics: (metric, label, highest first)
+RANKING_METRICS = [
+    ('directional_edge', 'Best Directional Edge', True),
+    ('stability_rate', 'Best Stability', True),
+    ('strong_variants', 'Most Strong Variants', True),
+    ('mean_fail_rate', 'Lowest Fail Rate', False),
+    ('mean_drift_high', 'Lowest Drift', False),
+    ('variant_count', 'Most Variants', True),
+    ('mean_sample_size', 'Best Sample Size', True),
+]
+
+def count_csv_rows(filepath):
+    """Count data rows in a CSV (one record per line) without parsing it."""
+    with open(filepath, 'rb', buffering=1 << 20) as f:
+        return sum(1 for _ in f) - 1
+
+def source_fingerprint(output_dir):
+    """(name, mtime, size) of each output CSV present, used as the cache key."""
+    fingerprint = []
+    for name in SOURCE_FILES:
+        source = output_dir / name
+        if source.exists():
+            stat = source.stat()
+            fingerprint.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
 def load_model_results(model_dir):
     """Load analysis results for a single model."""
     output_dir = Path(model_dir) / 'output'
@@ -27,6 +101,18 @@ def load_model_results(model_dir):
     if not output_dir.exists():
         return None
 
+    # Reuse cached results while the output CSVs are unchanged
+    cache_file = Path(model_dir) / RESULTS_CACHE_FILE
+    fingerprint = source_fingerprint(output_dir)
+    if cache_file.exists():
+        try:
+            with open(cache_file, 'rb') as f:
+                cached_fingerprint, cached_results = pickle.load(f)
+            if cached_fingerprint == fingerprint:
+                return {**cached_results, 'name': model_dir, 'path': str(output_dir)}
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            pass  # unreadable cache: recompute and overwrite it
+
     results = {
         'name': model_dir,
         'path': str(output_dir)
@@ -35,7 +121,8 @@ def load_model_results(model_dir):
     # Load probability map
     prob_map_file = output_dir / 'ny_probability_map.csv'
     if prob_map_file.exists():
-        prob_df = pd.read_csv(prob_map_file)
+        prob_df = pd.read_csv(prob_map_file, usecols=list(PROB_MAP_DTYPES), dtype=PROB_MAP_DTYPES,
+                              engine=CSV_ENGINE)
         results['prob_map'] = prob_df
         results['variant_count'] = len(prob_df)
         results['total_samples'] = prob_df['n'].sum()
@@ -44,15 +131,19 @@ def load_model_results(model_dir):
         results['min_sample_size'] = prob_df['n'].min()
         results['max_sample_size'] = prob_df['n'].max()
 
-        # Reliability distribution
-        results['high_reliability'] = len(prob_df[prob_df['n'] >= 150])
-        results['medium_reliability'] = len(prob_df[(prob_df['n'] >= 50) & (prob_df['n'] < 150)])
-        results['low_reliability'] = len(prob_df[prob_df['n'] < 50])
+        # Reliability distribution (one pass over n: 0 = Low, 1 = Medium, 2 = High)
+        reliability = np.searchsorted([50, 150], prob_df['n'].to_numpy(), side='right')
+        low_count, medium_count, high_count = np.bincount(reliability, minlength=3)
+        results['high_reliability'] = int(high_count)
+        results['medium_reliability'] = int(medium_count)
+        results['low_reliability'] = int(low_count)
 
         # Probability metrics
-        results['mean_p_high'] = prob_df['first_high_pct'].mean()
-        results['directional_edge'] = (prob_df['first_high_pct'] - 50).abs().mean()
-        results['max_edge'] = (prob_df['first_high_pct'] - 50).abs().max()
+        p_high = prob_df['first_high_pct']
+        edge = (p_high - 50).abs()
+        results['mean_p_high'] = p_high.mean()
+        results['directional_edge'] = edge.mean()
+        results['max_edge'] = edge.max()
         results['mean_fail_rate'] = prob_df['fail_pct'].mean()
         results['median_pen_high'] = prob_df['median_pen_high'].median()
         results['median_pen_low'] = prob_df['median_pen_low'].median()
@@ -63,15 +154,14 @@ def load_model_results(model_dir):
         results['top_variant_n'] = top_variant['n']
         results['top_variant_p_high'] = top_variant['first_high_pct']
 
-        # Strong edge variants (>70% or <30%)
-        results['strong_variants'] = len(prob_df[
-            (prob_df['first_high_pct'] > 70) | (prob_df['first_high_pct'] < 30)
-        ])
+        # Strong edge variants (>70% or <30%), i.e. more than 20 points of edge
+        results['strong_variants'] = int(np.count_nonzero(edge.to_numpy() > 20))
 
     # Load validation/drift report
     drift_file = output_dir / 'validation_drift_report.csv'
     if drift_file.exists():
-        drift_df = pd.read_csv(drift_file)
+        drift_df = pd.read_csv(drift_file, usecols=list(DRIFT_DTYPES), dtype=DRIFT_DTYPES,
+                               engine=CSV_ENGINE)
         results['drift_report'] = drift_df
         results['mean_drift_high'] = drift_df['drift_first_high'].mean()
         results['median_drift_high'] = drift_df['drift_first_high'].median()
@@ -80,16 +170,25 @@ def load_model_results(model_dir):
         results['unstable_variants'] = len(drift_df[drift_df['is_unstable']])
         results['stability_rate'] = results['stable_variants'] / len(drift_df) * 100 if len(drift_df) > 0 else 0
 
-    # Load daily data
+    # Count daily data rows (only the day count is needed)
     daily_file = output_dir / 'daily_sessions_with_labels.csv'
     if daily_file.exists():
-        daily_df = pd.read_csv(daily_file)
-        results['total_days'] = len(daily_df)
+        results['total_days'] = count_csv_rows(daily_file)
         results['coverage_rate'] = (results['total_samples'] / results['total_days'] * 100) if 'total_samples' in results else 0
 
+    with open(cache_file, 'wb') as f:
+        pickle.dump((fingerprint, results), f, protocol=pickle.HIGHEST_PROTOCOL)
+
     return results
 
-def generate_comparison_table(models):
+def build_comparison_frame(models):
+    """One row per model with the raw comparison metrics (NaN where missing)."""
+    return pd.DataFrame(
+        [{column: model.get(key) for column, key in COMPARISON_COLUMNS} for model in models],
+        columns=[column for column, _ in COMPARISON_COLUMNS]
+    )
+
+def generate_comparison_table(comp_df, models):
     """Generate comparison table across all models."""
     print("\n" + "="*100)
     print("NY PROBABILITY MAP - MODEL COMPARISON")
@@ -99,31 +198,37 @@ def generate_comparison_table(models):
         print("\nNo models found with output data.")
         return
 
-    # Create comparison DataFrame
-    comparison_data = []
-    for model in models:
-        comparison_data.append({
-            'Model': model['name'],
-            'Variants': model.get('variant_count', 'N/A'),
-            'Total Days': model.get('total_days', 'N/A'),
-            'Avg Samples': f"{model.get('mean_sample_size', 0):.1f}",
-            'High Rel': model.get('high_reliability', 0),
-            'Med Rel': model.get('medium_reliability', 0),
-            'Low Rel': model.get('low_reliability', 0),
-            'Dir Edge': f"{model.get('directional_edge', 0):.2f}%",
-            'Max Edge': f"{model.get('max_edge', 0):.2f}%",
-            'Fail Rate': f"{model.get('mean_fail_rate', 0):.1f}%",
-            'Stability': f"{model.get('stability_rate', 0):.1f}%",
-            'Mean Drift': f"{model.get('mean_drift_high', 0):.2f}%",
-            'Strong Vars': model.get('strong_variants', 0)
-        })
-
-    comp_df = pd.DataFrame(comparison_data)
+    # Format the summary from the comparison frame (missing counts show as
+    # N/A or 0, missing rates as 0)
+    def count_or_na(column):
+        return comp_df[column].map(lambda value: 'N/A' if pd.isna(value) else int(value))
+
+    def count(column):
+        return comp_df[column].fillna(0).astype('int64')
+
+    def fmt(column, spec):
+        return comp_df[column].fillna(0).map(spec.format)
+
+    summary_df = pd.DataFrame({
+        'Model': comp_df['model'],
+        'Variants': count_or_na('variant_count'),
+        'Total Days': count_or_na('total_days'),
+        'Avg Samples': fmt('mean_sample_size', '{:.1f}'),
+        'High Rel': count('high_reliability'),
+        'Med Rel': count('medium_reliability'),
+        'Low Rel': count('low_reliability'),
+        'Dir Edge': fmt('directional_edge', '{:.2f}%'),
+        'Max Edge': fmt('max_edge', '{:.2f}%'),
+        'Fail Rate': fmt('mean_fail_rate', '{:.1f}%'),
+        'Stability': fmt('stability_rate', '{:.1f}%'),
+        'Mean Drift': fmt('mean_drift', '{:.2f}%'),
+        'Strong Vars': count('strong_variants')
+    })
 
     print("\n" + "="*100)
     print("SUMMARY METRICS")
     print("="*100)
-    print(comp_df.to_string(index=False))
+    print(summary_df.to_string(index=False))
 
     # Detailed per-model analysis
     print("\n" + "="*100)
@@ -172,56 +277,25 @@ def generate_rankings(models):
     print("MODEL RANKINGS")
     print("="*100)
 
-    # Create rankings
-    rankings = {}
-
-    for metric, label, reverse in [
-        ('directional_edge', 'Best Directional Edge', True),
-        ('stability_rate', 'Best Stability', True),
-        ('strong_variants', 'Most Strong Variants', True),
-        ('mean_fail_rate', 'Lowest Fail Rate', False),
-        ('mean_drift_high', 'Lowest Drift', False),
-        ('variant_count', 'Most Variants', True),
-        ('mean_sample_size', 'Best Sample Size', True),
-    ]:
-        sorted_models = sorted(
-            [m for m in models if metric in m],
-            key=lambda x: x.get(metric, 0),
-            reverse=reverse
-        )
+    # One row per model (a missing metric is NaN and drops out of its ranking)
+    metric_names = [metric for metric, _, _ in RANKING_METRICS]
+    metrics = pd.DataFrame(
+        [{metric: model.get(metric, np.nan) for metric in metric_names} for model in models],
+        columns=metric_names
+    )
+
+    for metric, label, highest_first in RANKING_METRICS:
+        # Top 3 only; ties keep model order
+        column = metrics[metric].astype('float64').dropna()
+        top = column.nlargest(3) if highest_first else column.nsmallest(3)
 
         print(f"\n🏆 {label}:")
-        for i, model in enumerate(sorted_models[:3], 1):
+        for i, model in enumerate((models[pos] for pos in top.index), 1):
             print(f"  {i}. {model['name']}: {model.get(metric, 'N/A')}")
 
-def export_comparison_report(models, output_file='model_comparison_report.csv'):
+def export_comparison_report(comp_df, output_file='model_comparison_report.csv'):
     """Export comparison to CSV."""
-    comparison_data = []
-
-    for model in models:
-        comparison_data.append({
-            'model': model['name'],
-            'variant_count': model.get('variant_count', None),
-            'total_days': model.get('total_days', None),
-            'mean_sample_size': model.get('mean_sample_size', None),
-            'median_sample_size': model.get('median_sample_size', None),
-            'high_reliability': model.get('high_reliability', None),
-            'medium_reliability': model.get('medium_reliability', None),
-            'low_reliability': model.get('low_reliability', None),
-            'directional_edge': model.get('directional_edge', None),
-            'max_edge': model.get('max_edge', None),
-            'mean_fail_rate': model.get('mean_fail_rate', None),
-            'stability_rate': model.get('stability_rate', None),
-            'mean_drift': model.get('mean_drift_high', None),
-            'median_drift': model.get('median_drift_high', None),
-            'strong_variants': model.get('strong_variants', None),
-            'top_variant': model.get('top_variant_name', None),
-            'top_variant_n': model.get('top_variant_n', None),
-            'top_variant_p_high': model.get('top_variant_p_high', None)
-        })
-
-    df = pd.DataFrame(comparison_data)
-    df.to_csv(output_file, index=False)
+    comp_df.to_csv(output_file, index=False)
     print(f"\n✓ Comparison report exported: {output_file}")
 
 def main():
@@ -230,10 +304,14 @@ def main():
     print("LOADING MODEL RESULTS")
     print("="*100)
 
+    # Model directories are independent, so their CSV reads overlap in
+    # threads (results come back in MODEL_DIRS order)
+    with ThreadPoolExecutor(max_workers=min(8, len(MODEL_DIRS))) as executor:
+        loaded = list(executor.map(load_model_results, MODEL_DIRS))
+
     models = []
-    for model_dir in MODEL_DIRS:
+    for model_dir, results in zip(MODEL_DIRS, loaded):
         print(f"\nLoading {model_dir}...", end=' ')
-        results = load_model_results(model_dir)
         if results:
             models.append(results)
             print("✓")
@@ -246,10 +324,11 @@ def main():
         print("  cd models/base_model && python3 run_analysis.py")
         return
 
-    # Generate comparison
-    generate_comparison_table(models)
+    # Generate comparison (one comparison frame shared by table and report)
+    comp_df = build_comparison_frame(models)
+    generate_comparison_table(comp_df, models)
     generate_rankings(models)
-    export_comparison_report(models)
+    export_comparison_report(comp_df)
 
     print("\n" + "="*100)
     print("✓ COMPARISON COMPLETE")
@@ -10,11 +10,27 @@ Continuous Gapless Sessions:
 
 import pandas as pd
 import numpy as np
+import argparse
 import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import time, timedelta
+from itertools import product
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import pyarrow
+    import pyarrow.csv as pacsv
+except ImportError:  # optional: pandas C parser, no session cache or Parquet exports
+    pyarrow = None
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to json.dump
+    orjson = None
+
 # ============================================================================
 # CONFIGURATION (CORRECTED)
 # ============================================================================
@@ -29,11 +45,40 @@ SESSION_TIMES = {
     'ny_end': time(16, 0),          # 16:00
 }
 
+# Session tags for the per-bar groupby (column prefixes in the daily frame)
+SESSION_NAMES = ['asia', 'london', 'ny']
+
+# Factor categories (fixed order; a variant's code is its index in
+# VARIANT_LABELS, the same slot order generate_pinescript.py uses). Factor
+# columns are Categoricals over these lists from the start, so each day
+# stores small integer codes and strings only appear in the exports
+ASIA_REGIMES = ['Compressed', 'Normal', 'Expanded']
+LONDON_SWEEPS = ['None', 'High', 'Low', 'Both']
+OPEN_POSITIONS = ['Above', 'Below', 'Within']
+VARIANT_LABELS = ['|'.join(parts) for parts in
+                  product(ASIA_REGIMES, LONDON_SWEEPS, OPEN_POSITIONS, OPEN_POSITIONS)]
+
+# Session features and NY bars cached as Parquet (rebuilt when the minute
+# CSV is newer)
+SESSION_CACHE_FILE = 'nq_sessions.parquet'
+NY_BARS_CACHE_FILE = 'nq_ny_bars.parquet'
+
+# Arrow CSV reader: block size per parse task (~4 MB keeps every core busy
+# without tiny blocks) and the minute file's column types (no type inference)
+CSV_BLOCK_SIZE = 4 << 20
+MINUTE_COLUMN_TYPES = {
+    'Open': 'float64', 'High': 'float64', 'Low': 'float64', 'Close': 'float64',
+    'Volume': 'int64', 'TickVolume': 'int64'
+}
+
 # Analysis parameters
 ASIA_RANGE_WINDOW = 200  # Rolling window for Asia range quantiles
 LONDON_MID_TOLERANCE = 0.25  # 25% of London range for "Within" band
 PENETRATION_WINDOW = 30  # Minutes to track penetration after first sweep
 
+# Write buffer for the exported CSVs (1 MB instead of the default 8 KB)
+EXPORT_BUFFER_SIZE = 1 << 20
+
 # ============================================================================
 # STEP 1: DATA LOADING
 # ============================================================================
@@ -44,8 +89,20 @@ def load_clean_data(filepath='nq_1m_et.csv'):
     print("LOADING CLEAN DATA")
     print("="*80)
 
-    df = pd.read_csv(filepath, index_col=0)
-    df.index = pd.to_datetime(df.index, utc=True).tz_convert('America/New_York')
+    if pyarrow is not None:
+        # Block-parallel Arrow reader over a memory-mapped file (the parser
+        # reads the page cache directly); offset timestamps are parsed natively
+        with pyarrow.memory_map(filepath) as source:
+            table = pacsv.read_csv(
+                source,
+                read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=True),
+                convert_options=pacsv.ConvertOptions(column_types=MINUTE_COLUMN_TYPES)
+            )
+        df = table.to_pandas()
+        df = df.set_index(df.columns[0])
+    else:
+        df = pd.read_csv(filepath, index_col=0)
+    df.index = pd.to_datetime(df.index, utc=True).tz_convert('America/New_York').as_unit('ns')
     print(f"\nLoaded {len(df):,} rows")
     print(f"Date range: {df.index.min()} to {df.index.max()}")
     print(f"Columns: {list(df.columns)}")
@@ -56,57 +113,10 @@ def load_clean_data(filepath='nq_1m_et.csv'):
 # STEP 2: SESSION BOUNDARY CALCULATION (CORRECTED)
 # ============================================================================
 
-def get_session_data(df, date, start_time, end_time, prev_day=False):
-    """
-    Extract OHLC data for a specific session.
-
-    Args:
-        df: DataFrame with minute data
-        date: Trading date
-        start_time: Session start time
-        end_time: Session end time
-        prev_day: If True, session starts on previous day
-
-    Returns:
-        Dictionary with session OHLC, midpoint, and range
-    """
-    if prev_day:
-        start_dt = pd.Timestamp.combine(date - pd.Timedelta(days=1), start_time)
-    else:
-        start_dt = pd.Timestamp.combine(date, start_time)
-
-    end_dt = pd.Timestamp.combine(date, end_time)
-
-    # Handle midnight crossing
-    if end_time < start_time and not prev_day:
-        end_dt += pd.Timedelta(days=1)
-
-    # Localize to America/New_York (handle DST transitions)
-    try:
-        start_dt = start_dt.tz_localize('America/New_York', nonexistent='shift_forward', ambiguous='NaT')
-    except:
-        start_dt = start_dt.tz_localize('America/New_York', nonexistent='shift_forward')
-
-    try:
-        end_dt = end_dt.tz_localize('America/New_York', nonexistent='shift_forward', ambiguous='NaT')
-    except:
-        end_dt = end_dt.tz_localize('America/New_York', nonexistent='shift_forward')
-
-    # Extract session data
-    session_data = df[(df.index >= start_dt) & (df.index < end_dt)]
-
-    if len(session_data) == 0:
-        return None
-
-    return {
-        'open': session_data['Open'].iloc[0],
-        'high': session_data['High'].max(),
-        'low': session_data['Low'].min(),
-        'close': session_data['Close'].iloc[-1],
-        'midpoint': (session_data['High'].max() + session_data['Low'].min()) / 2,
-        'range': session_data['High'].max() - session_data['Low'].min(),
-        'data': session_data
-    }
+def expand_ranges(starts, ends):
+    """Positions covered by the half-open ranges [starts[i], ends[i]), concatenated."""
+    lengths = ends - starts
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
 
 def calculate_daily_sessions(df):
     """
@@ -126,70 +136,109 @@ def calculate_daily_sessions(df):
     print("  NY:     08:00 - 16:00")
     print("  (Continuous - No Gap!)")
 
-    # Get unique trading dates
-    dates = df.index.normalize().unique()
-
-    daily_sessions = []
-
-    for i, date in enumerate(dates):
-        if i % 100 == 0:
-            print(f"Processing day {i+1}/{len(dates)}...", end='\r')
-
-        # Extract each session
-        asia = get_session_data(df, date,
-                               SESSION_TIMES['asia_start'],
-                               SESSION_TIMES['asia_end'],
-                               prev_day=True)
-
-        london = get_session_data(df, date,
-                                 SESSION_TIMES['london_start'],
-                                 SESSION_TIMES['london_end'])
-
-        ny = get_session_data(df, date,
-                             SESSION_TIMES['ny_start'],
-                             SESSION_TIMES['ny_end'])
-
-        # Capture "transition open" at 08:00 (handoff from London to NY)
-        handoff_time = pd.Timestamp(date.date()).tz_localize('America/New_York') + pd.Timedelta(hours=8)
-        handoff_bar = df[(df.index >= handoff_time) & (df.index < handoff_time + pd.Timedelta(minutes=1))]
-        transition_open = handoff_bar['Open'].iloc[0] if len(handoff_bar) > 0 else None
-
-        # Skip days with missing sessions
-        if any(s is None for s in [asia, london, ny]) or transition_open is None:
-            continue
-
-        daily_sessions.append({
-            'date': date,
-            # Asia session
-            'asia_open': asia['open'],
-            'asia_high': asia['high'],
-            'asia_low': asia['low'],
-            'asia_close': asia['close'],
-            'asia_mid': asia['midpoint'],
-            'asia_range': asia['range'],
-            # London session
-            'london_open': london['open'],
-            'london_high': london['high'],
-            'london_low': london['low'],
-            'london_close': london['close'],
-            'london_mid': london['midpoint'],
-            'london_range': london['range'],
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+
+    # Tag every bar with its session and trading date once, on wall-clock NY
+    # time (Asia bars from 16:00 on belong to the next day)
+    local = df.index.tz_localize(None)
+    minute_of_day = local.hour * 60 + local.minute
+    asia_start = SESSION_TIMES['asia_start'].hour * 60 + SESSION_TIMES['asia_start'].minute
+    london_start = SESSION_TIMES['london_start'].hour * 60 + SESSION_TIMES['london_start'].minute
+    ny_start = SESSION_TIMES['ny_start'].hour * 60 + SESSION_TIMES['ny_start'].minute
+
+    # Session codes index SESSION_NAMES
+    session = np.select(
+        [(minute_of_day >= asia_start) | (minute_of_day < london_start), minute_of_day < ny_start],
+        [0, 1], default=2
+    )
+    bar_date = local.normalize()
+    trading_date = bar_date + pd.to_timedelta(np.where(minute_of_day >= asia_start, 1, 0), unit='D')
+
+    # One grouped reduction gives the OHLC (and bar span) of every session
+    bars = df[['Open', 'High', 'Low', 'Close']].assign(pos=np.arange(len(df)))
+    ohlc = bars.groupby([trading_date, session]).agg(
+        open=('Open', 'first'),
+        high=('High', 'max'),
+        low=('Low', 'min'),
+        close=('Close', 'last'),
+        first_pos=('pos', 'first'),
+        last_pos=('pos', 'last')
+    ).unstack()
+
+    # Capture "transition open" at 08:00 (handoff from London to NY)
+    is_handoff = minute_of_day == ny_start
+    transition_open = df['Open'][is_handoff].groupby(bar_date[is_handoff]).first()
+
+    # Skip days with missing sessions
+    ohlc = ohlc.dropna(subset=[('open', code) for code in range(len(SESSION_NAMES))])
+    ohlc = ohlc[ohlc.index.isin(transition_open.index)]
+
+    sessions = {'date': ohlc.index.tz_localize('America/New_York')}
+    for code, name in enumerate(SESSION_NAMES):
+        if name == 'ny':
             # Transition price (handoff at 08:00)
-            'transition_open': transition_open,
-            # NY session
-            'ny_open': ny['open'],
-            'ny_high': ny['high'],
-            'ny_low': ny['low'],
-            'ny_close': ny['close'],
-            # Raw data for label calculation
-            'ny_data': ny['data']
-        })
-
-    sessions_df = pd.DataFrame(daily_sessions)
-    print(f"\n\nCalculated sessions for {len(sessions_df):,} trading days")
+            sessions['transition_open'] = transition_open.reindex(ohlc.index).to_numpy()
+
+        high = ohlc[('high', code)].to_numpy()
+        low = ohlc[('low', code)].to_numpy()
+        sessions[f'{name}_open'] = ohlc[('open', code)].to_numpy()
+        sessions[f'{name}_high'] = high
+        sessions[f'{name}_low'] = low
+        sessions[f'{name}_close'] = ohlc[('close', code)].to_numpy()
+        if name != 'ny':
+            sessions[f'{name}_mid'] = (high + low) / 2
+            sessions[f'{name}_range'] = high - low
+
+    sessions_df = pd.DataFrame(sessions)
+
+    # NY bar range [start, end) in the minute frame, for label calculation
+    ny_code = SESSION_NAMES.index('ny')
+    sessions_df['ny_start_idx'] = ohlc[('first_pos', ny_code)].to_numpy().astype(np.int64)
+    sessions_df['ny_end_idx'] = ohlc[('last_pos', ny_code)].to_numpy().astype(np.int64) + 1
+
+    print(f"\nCalculated sessions for {len(sessions_df):,} trading days")
 
     return sessions_df
 
+def load_cached_sessions(filepath='nq_1m_et.csv'):
+    """
+    Load cached session features and NY bars.
+
+    Returns:
+        (sessions_df, ny_bars) with NY ranges indexing ny_bars, or None if the
+        cache is stale or missing
+    """
+    cache_files = [SESSION_CACHE_FILE, NY_BARS_CACHE_FILE]
+    if pyarrow is None or not all(os.path.exists(f) for f in cache_files):
+        return None
+
+    source_mtime = os.path.getmtime(filepath)
+    if any(os.path.getmtime(f) <= source_mtime for f in cache_files):
+        return None
+
+    sessions_df = pd.read_parquet(SESSION_CACHE_FILE)
+    ny_bars = pd.read_parquet(NY_BARS_CACHE_FILE)
+
+    print(f"\n✓ Loaded cached sessions for {len(sessions_df):,} trading days: {SESSION_CACHE_FILE}")
+
+    return sessions_df, ny_bars
+
+def save_sessions(sessions_df, df):
+    """Cache session features and the NY bars (High/Low) they cover as Parquet."""
+    if pyarrow is None:
+        return
+
+    # Keep only the NY bars, stored day after day, and re-point the ranges
+    starts = sessions_df['ny_start_idx'].to_numpy()
+    ends = sessions_df['ny_end_idx'].to_numpy()
+    ny_bars = df[['High', 'Low']].iloc[expand_ranges(starts, ends)]
+    cached_ends = np.cumsum(ends - starts)
+
+    sessions_df.assign(ny_start_idx=cached_ends - (ends - starts), ny_end_idx=cached_ends) \
+        .to_parquet(SESSION_CACHE_FILE, compression='zstd')
+    ny_bars.to_parquet(NY_BARS_CACHE_FILE, compression='zstd')
+
 # ============================================================================
 # STEP 3: 108-VARIANT CONTEXT ENGINE
 # ============================================================================
@@ -205,31 +254,28 @@ def calculate_asia_range_regime(df):
     print("CALCULATING ASIA RANGE REGIME (Dynamic)")
     print("="*80)
 
-    # Calculate rolling quantiles
-    df['asia_range_q33'] = df['asia_range'].rolling(
-        window=ASIA_RANGE_WINDOW, min_periods=50
-    ).quantile(0.33)
-
-    df['asia_range_q66'] = df['asia_range'].rolling(
-        window=ASIA_RANGE_WINDOW, min_periods=50
-    ).quantile(0.66)
-
-    # Classify regime
-    def classify_regime(row):
-        if pd.isna(row['asia_range_q33']):
-            return None
-        if row['asia_range'] < row['asia_range_q33']:
-            return 'Compressed'
-        elif row['asia_range'] > row['asia_range_q66']:
-            return 'Expanded'
-        else:
-            return 'Normal'
-
-    df['asia_regime'] = df.apply(classify_regime, axis=1)
+    # Calculate rolling quantiles. pandas keeps each window in a skiplist
+    # (O(log w) per step, no per-window sort), which is faster here than a
+    # sliding-window np.quantile and matches its linear interpolation
+    asia_range_window = df['asia_range'].rolling(window=ASIA_RANGE_WINDOW, min_periods=50)
+    df['asia_range_q33'] = asia_range_window.quantile(0.33)
+    df['asia_range_q66'] = asia_range_window.quantile(0.66)
+
+    # Classify regime (column-wise; NaN until the rolling window fills)
+    asia_range = df['asia_range'].to_numpy()
+    q33 = df['asia_range_q33'].to_numpy()
+    q66 = df['asia_range_q66'].to_numpy()
+
+    regime = np.select(
+        [np.isnan(q33), asia_range < q33, asia_range > q66],
+        [-1, ASIA_REGIMES.index('Compressed'), ASIA_REGIMES.index('Expanded')],
+        default=ASIA_REGIMES.index('Normal')
+    )
+    df['asia_regime'] = pd.Categorical.from_codes(regime, categories=ASIA_REGIMES)
 
     # Remove rows with insufficient data
     initial_count = len(df)
-    df = df.dropna(subset=['asia_regime'])
+    df.dropna(subset=['asia_regime'], inplace=True)
     removed = initial_count - len(df)
 
     print(f"\nRemoved {removed} days (insufficient rolling data)")
@@ -253,29 +299,40 @@ def calculate_london_sweep(df):
     print("="*80)
     print("Comparing London (02:00-08:00) vs Asia (16:00-02:00)")
 
-    def classify_sweep(row):
-        swept_high = row['london_high'] > row['asia_high']
-        swept_low = row['london_low'] < row['asia_low']
-
-        if swept_high and swept_low:
-            return 'Both'
-        elif swept_high:
-            return 'High'
-        elif swept_low:
-            return 'Low'
-        else:
-            return 'None'
+    swept_high = df['london_high'].to_numpy() > df['asia_high'].to_numpy()
+    swept_low = df['london_low'].to_numpy() < df['asia_low'].to_numpy()
 
-    df['london_sweep'] = df.apply(classify_sweep, axis=1)
+    sweep = np.select(
+        [swept_high & swept_low, swept_high, swept_low],
+        [LONDON_SWEEPS.index('Both'), LONDON_SWEEPS.index('High'), LONDON_SWEEPS.index('Low')],
+        default=LONDON_SWEEPS.index('None')
+    )
+    df['london_sweep'] = pd.Categorical.from_codes(sweep, categories=LONDON_SWEEPS)
 
     print(f"\nLondon Sweep Distribution:")
     print(df['london_sweep'].value_counts())
 
     return df
 
+def calculate_london_mid_band(df):
+    """
+    Calculate the tolerance band around the London Midpoint, shared by every
+    open-vs-London-mid comparison.
+
+    Returns:
+        DataFrame with 'london_mid_tolerance', 'london_mid_upper' and
+        'london_mid_lower' columns
+    """
+    df['london_mid_tolerance'] = df['london_range'] * LONDON_MID_TOLERANCE
+    df['london_mid_upper'] = df['london_mid'] + df['london_mid_tolerance']
+    df['london_mid_lower'] = df['london_mid'] - df['london_mid_tolerance']
+
+    return df
+
 def calculate_open_vs_london_mid(df, open_col, label):
     """
-    Calculate Open position relative to London Midpoint with tolerance band.
+    Calculate Open position relative to London Midpoint with tolerance band
+    (from calculate_london_mid_band).
 
     London Mid is from 02:00-08:00 session
 
@@ -292,20 +349,15 @@ def calculate_open_vs_london_mid(df, open_col, label):
     print(f"{'='*80}")
     print(f"Using London Mid from 02:00-08:00 session")
 
-    # Calculate tolerance band
-    df['london_mid_tolerance'] = df['london_range'] * LONDON_MID_TOLERANCE
-    df['london_mid_upper'] = df['london_mid'] + df['london_mid_tolerance']
-    df['london_mid_lower'] = df['london_mid'] - df['london_mid_tolerance']
+    open_price = df[open_col].to_numpy()
 
-    def classify_position(row):
-        if row[open_col] > row['london_mid_upper']:
-            return 'Above'
-        elif row[open_col] < row['london_mid_lower']:
-            return 'Below'
-        else:
-            return 'Within'
-
-    df[label] = df.apply(classify_position, axis=1)
+    position = np.select(
+        [open_price > df['london_mid_upper'].to_numpy(),
+         open_price < df['london_mid_lower'].to_numpy()],
+        [OPEN_POSITIONS.index('Above'), OPEN_POSITIONS.index('Below')],
+        default=OPEN_POSITIONS.index('Within')
+    )
+    df[label] = pd.Categorical.from_codes(position, categories=OPEN_POSITIONS)
 
     print(f"\n{label} Distribution:")
     print(df[label].value_counts())
@@ -323,17 +375,22 @@ def create_variant_fingerprint(df):
     print("CREATING VARIANT FINGERPRINTS")
     print("="*80)
 
-    df['variant'] = (
-        df['asia_regime'] + '|' +
-        df['london_sweep'] + '|' +
-        df['transition_vs_london_mid'] + '|' +
-        df['ny_open_vs_london_mid']
-    )
-
-    unique_variants = df['variant'].nunique()
+    # Combine the factor codes into the variant code (no per-row strings).
+    # Mixed radix rather than bit shifts: the codes stay dense (0-107), so
+    # they index VARIANT_LABELS directly and fit in int16
+    variant = df['asia_regime'].cat.codes.to_numpy(np.int16)
+    variant = variant * len(LONDON_SWEEPS) + df['london_sweep'].cat.codes.to_numpy(np.int16)
+    variant = variant * len(OPEN_POSITIONS) + df['transition_vs_london_mid'].cat.codes.to_numpy(np.int16)
+    variant = variant * len(OPEN_POSITIONS) + df['ny_open_vs_london_mid'].cat.codes.to_numpy(np.int16)
+    df['variant'] = pd.Categorical.from_codes(variant, categories=VARIANT_LABELS)
+
+    # One count over the int16 codes (every category, unseen ones at 0)
+    # serves both the unique count and the top 10
+    variant_counts = df['variant'].value_counts()
+    unique_variants = int((variant_counts > 0).sum())
     print(f"\nUnique variants found: {unique_variants}")
     print(f"\nTop 10 most common variants:")
-    print(df['variant'].value_counts().head(10))
+    print(variant_counts.head(10))
 
     return df
 
@@ -341,12 +398,16 @@ def create_variant_fingerprint(df):
 # STEP 4: LABEL CALCULATION (CORRECTED)
 # ============================================================================
 
-def calculate_labels(df):
+def calculate_labels(df, minute_df):
     """
     Calculate outcome labels for the NY window (08:00-16:00).
 
     Target levels are from London 02:00-08:00 session
 
+    Args:
+        df: Daily frame with NY bar ranges (ny_start_idx, ny_end_idx)
+        minute_df: Minute bars the NY ranges index into
+
     Labels:
     - first_sweep_side: Which level was hit first (High/Low)
     - fail_flag: Did the opposite level get hit after first sweep?
@@ -361,94 +422,83 @@ def calculate_labels(df):
     print("="*80)
     print("Target levels from London 02:00-08:00 session")
 
-    labels = []
-
-    for idx, row in df.iterrows():
-        if idx % 100 == 0:
-            print(f"Processing label {idx+1}/{len(df)}...", end='\r')
-
-        ny_data = row['ny_data']
-        target_high = row['london_high']  # From 02:00-08:00 session
-        target_low = row['london_low']    # From 02:00-08:00 session
-
-        # Track sweep times
-        hit_high_time = None
-        hit_low_time = None
-
-        for ts, price_row in ny_data.iterrows():
-            if price_row['High'] >= target_high and hit_high_time is None:
-                hit_high_time = ts
-            if price_row['Low'] <= target_low and hit_low_time is None:
-                hit_low_time = ts
-
-        # Determine first sweep side
-        if hit_high_time is None and hit_low_time is None:
-            first_sweep_side = None
-            first_sweep_time = None
-        elif hit_high_time is None:
-            first_sweep_side = 'Low'
-            first_sweep_time = hit_low_time
-        elif hit_low_time is None:
-            first_sweep_side = 'High'
-            first_sweep_time = hit_high_time
-        else:
-            if hit_high_time < hit_low_time:
-                first_sweep_side = 'High'
-                first_sweep_time = hit_high_time
-            else:
-                first_sweep_side = 'Low'
-                first_sweep_time = hit_low_time
-
-        # Calculate flags
-        both_flag = 1 if (hit_high_time is not None and hit_low_time is not None) else 0
-
-        if first_sweep_side == 'High':
-            fail_flag = 1 if hit_low_time is not None else 0
-        elif first_sweep_side == 'Low':
-            fail_flag = 1 if hit_high_time is not None else 0
-        else:
-            fail_flag = 0
-
-        # Calculate median penetration
-        median_penetration = np.nan
-
-        if first_sweep_time is not None:
-            penetration_window_end = first_sweep_time + pd.Timedelta(minutes=PENETRATION_WINDOW)
-            penetration_data = ny_data[
-                (ny_data.index >= first_sweep_time) &
-                (ny_data.index < penetration_window_end)
-            ]
-
-            if len(penetration_data) > 0:
-                if first_sweep_side == 'High':
-                    # Track overshoots above target_high
-                    overshoots = penetration_data['High'] - target_high
-                    overshoots = overshoots[overshoots > 0]
-                else:
-                    # Track overshoots below target_low
-                    overshoots = target_low - penetration_data['Low']
-                    overshoots = overshoots[overshoots > 0]
-
-                if len(overshoots) > 0:
-                    median_penetration = overshoots.median()
+    target_high = df['london_high'].to_numpy()  # From 02:00-08:00 session
+    target_low = df['london_low'].to_numpy()    # From 02:00-08:00 session
+
+    # Every NY bar gathered from its day's range, tagged with its day (row) number
+    starts = df['ny_start_idx'].to_numpy()
+    ends = df['ny_end_idx'].to_numpy()
+    bars_per_day = ends - starts
+    day = np.repeat(np.arange(len(df)), bars_per_day)
+    ny_pos = expand_ranges(starts, ends)
+    ts = minute_df.index.asi8[ny_pos]
+    high = minute_df['High'].to_numpy()[ny_pos]
+    low = minute_df['Low'].to_numpy()[ny_pos]
+
+    def first_hit(hit):
+        """Bar position of each day's first hit (-1 if never hit)."""
+        first = np.full(len(df), -1)
+        pos = np.flatnonzero(hit)
+        is_first = np.diff(day[pos], prepend=-1) != 0
+        first[day[pos[is_first]]] = pos[is_first]
+        return first
+
+    # Track sweep times
+    hit_high = first_hit(high >= target_high[day])
+    hit_low = first_hit(low <= target_low[day])
+    has_high = hit_high >= 0
+    has_low = hit_low >= 0
+    hit_high_time = ts[hit_high]
+    hit_low_time = ts[hit_low]
+
+    # Determine first sweep side (a tie on the same bar counts as 'Low')
+    first_high = has_high & (~has_low | (hit_high_time < hit_low_time))
+    first_low = has_low & ~first_high
+    swept = first_high | first_low
+
+    first_sweep_side = pd.Categorical.from_codes(
+        np.select([first_high, first_low], [0, 1], default=-1), categories=['High', 'Low']
+    )
 
-        labels.append({
-            'first_sweep_side': first_sweep_side,
-            'fail_flag': fail_flag,
-            'both_flag': both_flag,
-            'median_penetration': median_penetration
-        })
+    # Calculate flags (after a first sweep, a fail is the opposite level
+    # being hit too, i.e. both levels hit)
+    both_flag = (has_high & has_low).astype(np.int8)
+    fail_flag = both_flag.copy()
+
+    # Calculate median penetration: overshoots beyond the swept level within
+    # PENETRATION_WINDOW minutes of the first sweep. Bars are time-ordered, so
+    # each window is the run of bars from the first sweep bar to the first bar
+    # at or after the window end; only those bars are gathered
+    swept_days = np.flatnonzero(swept)
+    window_start = np.where(first_high, hit_high, hit_low)[swept_days]
+    window_end_time = np.where(first_high, hit_high_time, hit_low_time)[swept_days] + \
+        pd.Timedelta(minutes=PENETRATION_WINDOW).value
+    window_end = np.minimum(np.searchsorted(ts, window_end_time), np.cumsum(bars_per_day)[swept_days])
+
+    window_day = np.repeat(swept_days, window_end - window_start)
+    pos = expand_ranges(window_start, window_end)
+
+    overshoots = np.where(first_high[window_day],
+                          high[pos] - target_high[window_day],
+                          target_low[window_day] - low[pos])
+    penetrating = overshoots > 0
+    median_penetration = (
+        pd.Series(overshoots[penetrating]).groupby(window_day[penetrating]).median()
+        .reindex(np.arange(len(df))).to_numpy()
+    )
 
-    # Add labels to dataframe
-    labels_df = pd.DataFrame(labels, index=df.index)
-    df = pd.concat([df, labels_df], axis=1)
+    # Add labels to dataframe (column assignment, no concatenated copy)
+    df['first_sweep_side'] = first_sweep_side
+    df['fail_flag'] = fail_flag
+    df['both_flag'] = both_flag
+    df['median_penetration'] = median_penetration
 
     # Remove rows with no sweep
     initial_count = len(df)
-    df = df.dropna(subset=['first_sweep_side'])
+    df.dropna(subset=['first_sweep_side'], inplace=True)
     removed = initial_count - len(df)
 
-    print(f"\n\nRemoved {removed} days with no sweep")
+    print(f"\nRemoved {removed} days with no sweep")
     print(f"Remaining days: {len(df):,}")
 
     print(f"\nFirst Sweep Distribution:")
@@ -475,57 +525,76 @@ def aggregate_probabilities(df):
     print("AGGREGATING PROBABILITIES BY VARIANT")
     print("="*80)
 
-    results = []
-
-    for variant in df['variant'].unique():
-        variant_data = df[df['variant'] == variant]
-        n = len(variant_data)
-
-        # Calculate probabilities
-        first_high_count = (variant_data['first_sweep_side'] == 'High').sum()
-        first_low_count = (variant_data['first_sweep_side'] == 'Low').sum()
-
-        first_high_pct = (first_high_count / n * 100) if n > 0 else 0
-        first_low_pct = (first_low_count / n * 100) if n > 0 else 0
-
-        sweep_both_pct = variant_data['both_flag'].mean() * 100
-        fail_pct = variant_data['fail_flag'].mean() * 100
-
-        # Median penetration by side
-        high_sweeps = variant_data[variant_data['first_sweep_side'] == 'High']
-        low_sweeps = variant_data[variant_data['first_sweep_side'] == 'Low']
-
-        median_pen_high = high_sweeps['median_penetration'].median() if len(high_sweeps) > 0 else np.nan
-        median_pen_low = low_sweeps['median_penetration'].median() if len(low_sweeps) > 0 else np.nan
-
+    # Day positions sorted by variant code (stable, so days keep their order
+    # within a variant): every variant is then one contiguous run, and the
+    # per-variant sums are np.add.reduceat over the run starts. Only the
+    # positions are sorted; the daily frame keeps its row order
+    codes = df['variant'].cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    # Runs listed in order of first appearance (a stable sort puts each
+    # variant's first day at its run start)
+    runs = np.argsort(order[starts], kind='stable')
+    variant_codes = sorted_codes[starts][runs]
+    n = np.diff(np.r_[starts, len(codes)])[runs]
+
+    def run_sums(values):
+        # int64 so bool and int8 flags neither OR together nor overflow
+        return np.add.reduceat(values.astype(np.int64)[order], starts)[runs]
+
+    is_high = (df['first_sweep_side'] == 'High').to_numpy()
+    is_low = (df['first_sweep_side'] == 'Low').to_numpy()
+    first_high_count = run_sums(is_high)
+    first_low_count = run_sums(is_low)
+    sweep_both = run_sums(df['both_flag'].to_numpy()) / n
+    fail = run_sums(df['fail_flag'].to_numpy()) / n
+
+    # Median penetration by side: the side's days sorted by (variant code,
+    # penetration), NaN last within each run, so a variant's median is the
+    # middle of the first k_valid values of its run
+    penetration = df['median_penetration'].to_numpy()
+
+    def run_medians(mask):
+        side = np.flatnonzero(mask)
+        side = side[np.lexsort((penetration[side], codes[side]))]
+        values = penetration[side]
+        side_codes = codes[side]
+        if not len(values):
+            return np.full(len(variant_codes), np.nan)
+        run_start = np.searchsorted(side_codes, variant_codes)
+        k_valid = np.bincount(side_codes[~np.isnan(values)], minlength=len(VARIANT_LABELS))[variant_codes]
+        lower = values.take(run_start + (k_valid - 1) // 2, mode='clip')
+        upper = values.take(run_start + k_valid // 2, mode='clip')
+        return np.where(k_valid > 0, (lower + upper) / 2, np.nan)
+
+    median_pen_high = run_medians(is_high)
+    median_pen_low = run_medians(is_low)
+
+    # Parse variant components
+    variants = pd.Series(np.asarray(VARIANT_LABELS, dtype=object)[variant_codes])
+    parts = variants.str.split('|', expand=True)
+
+    prob_map = pd.DataFrame({
+        'variant': variants,
+        'asia_regime': parts[0],
+        'london_sweep': parts[1],
+        'transition_vs_london': parts[2],
+        'ny_open_vs_london': parts[3],
+        'n': n,
+        'first_high_pct': np.round(first_high_count / n * 100, 2),
+        'first_low_pct': np.round(first_low_count / n * 100, 2),
+        'sweep_both_pct': np.round(sweep_both * 100, 2),
+        'fail_pct': np.round(fail * 100, 2),
+        'median_pen_high': np.round(median_pen_high, 2),
+        'median_pen_low': np.round(median_pen_low, 2),
         # Reliability tag
-        if n < 50:
-            reliability = 'Low'
-        elif n < 150:
-            reliability = 'Medium'
-        else:
-            reliability = 'High'
-
-        # Parse variant components
-        parts = variant.split('|')
-
-        results.append({
-            'variant': variant,
-            'asia_regime': parts[0],
-            'london_sweep': parts[1],
-            'transition_vs_london': parts[2],
-            'ny_open_vs_london': parts[3],
-            'n': n,
-            'first_high_pct': round(first_high_pct, 2),
-            'first_low_pct': round(first_low_pct, 2),
-            'sweep_both_pct': round(sweep_both_pct, 2),
-            'fail_pct': round(fail_pct, 2),
-            'median_pen_high': round(median_pen_high, 2) if not np.isnan(median_pen_high) else None,
-            'median_pen_low': round(median_pen_low, 2) if not np.isnan(median_pen_low) else None,
-            'reliability': reliability
-        })
-
-    prob_map = pd.DataFrame(results)
+        'reliability': np.select([n < 50, n < 150], ['Low', 'Medium'], default='High')
+    })
+    # Rates stay float64: they are rounded to 2 decimals, so the exports
+    # already print short reprs, while float32 would surface as
+    # 53.849998474121094 in the JSON records (and 53.849998 with '%.6f')
     prob_map = prob_map.sort_values('n', ascending=False)
 
     print(f"\nTotal variants: {len(prob_map)}")
@@ -541,66 +610,167 @@ def aggregate_probabilities(df):
 # STEP 6: EXPORT RESULTS
 # ============================================================================
 
+def json_values(series):
+    """
+    Return a column as native Python scalars for the JSON exports, with
+    missing (non-finite) floats as None, which JSON writes as null.
+    """
+    values = series.tolist()
+    if series.dtype.kind == 'f':
+        values = [value if math.isfinite(value) else None for value in values]
+    return values
+
 def export_results(prob_map, daily_data, csv_file='ny_probability_map.csv',
-                  json_file='ny_probability_map.json'):
-    """Export probability map to CSV and JSON."""
+                  json_file='ny_probability_map.json', ndjson_file=None, daily_csv=True,
+                  human=False):
+    """
+    Export probability map to CSV and JSON.
+
+    The JSON is compact unless human is set, which indents it by two spaces
+    for reading. With ndjson_file set, the records are also streamed there
+    as compact newline-delimited JSON, one variant per line. With
+    daily_csv=False the daily data is only handed off as Parquet (when
+    pyarrow is available); the backtest and model comparison still read the
+    CSV.
+    """
     print("\n" + "="*80)
     print("EXPORTING RESULTS")
     print("="*80)
 
-    # Export CSV
-    prob_map.to_csv(csv_file, index=False)
-    print(f"\n✓ Exported CSV: {csv_file}")
-    print(f"  Rows: {len(prob_map)}")
+    # The n-sorted map carries a permuted integer index; none of the exports
+    # write it, so it is swapped for a RangeIndex
+    if not isinstance(prob_map.index, pd.RangeIndex):
+        prob_map = prob_map.reset_index(drop=True)
 
-    # Export JSON
-    prob_map_json = prob_map.to_dict(orient='records')
-    with open(json_file, 'w') as f:
-        json.dump(prob_map_json, f, indent=2)
-    print(f"✓ Exported JSON: {json_file}")
-
-    # Also save daily data for validation
     daily_data_file = 'daily_sessions_with_labels.csv'
-    daily_data.drop(columns=['ny_data'], inplace=True)
-    daily_data.to_csv(daily_data_file, index=False)
-    print(f"✓ Exported daily data: {daily_data_file}")
+    # del removes the NY bar ranges without drop's reindex of the other blocks
+    del daily_data['ny_start_idx'], daily_data['ny_end_idx']
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # Parquet copies of both tables (columnar, typed, zstd); validation
+        # and PineScript generation read these in preference to the text
+        # exports. Arrow encodes and writes without holding the GIL, so they
+        # are written on a worker thread (from shallow copies, which pandas
+        # can consolidate independently) while the text exports are formatted
+        parquet_jobs = []
+        if pyarrow is not None:
+            for frame, text_file in ((prob_map, csv_file), (daily_data, daily_data_file)):
+                parquet_file = os.path.splitext(text_file)[0] + '.parquet'
+                parquet_jobs.append((parquet_file, executor.submit(
+                    frame.copy(deep=False).to_parquet, parquet_file, compression='zstd', index=False)))
+
+        # Export CSV. Both files stay on the pandas writer: pyarrow.csv.write_csv
+        # quotes every string field, writes whole floats without '.0' and rounds
+        # doubles to 16 significant digits, which would change the exports. A
+        # schema-specialized row encoder matched to_csv byte for byte but saved
+        # only ~15% on the daily file (float repr dominates either way) and was
+        # slower on the 36-row map. Handles get a 1 MB buffer so rows reach the
+        # file in large writes.
+        with open(csv_file, 'w', buffering=EXPORT_BUFFER_SIZE, newline='') as f:
+            prob_map.to_csv(f, index=False)
+        print(f"\n✓ Exported CSV: {csv_file}")
+        print(f"  Rows: {len(prob_map)}")
+
+        # Export JSON. Records are zipped from per-column tolist() (native
+        # Python scalars) rather than to_dict(orient='records'), which boxes
+        # every cell
+        columns = list(prob_map.columns)
+        prob_map_json = [dict(zip(columns, row)) for row in
+                         zip(*(json_values(prob_map[col]) for col in columns))]
+        # Missing medians are None by now, so both writers emit null and the
+        # files are the same with or without orjson; allow_nan=False keeps
+        # the stdlib writer from ever emitting the invalid NaN literal.
+        # json.load and orjson.loads read null back as None, pandas as NaN
+        if orjson is not None:
+            with open(json_file, 'wb') as f:
+                f.write(orjson.dumps(prob_map_json, option=orjson.OPT_INDENT_2 if human else 0))
+        else:
+            with open(json_file, 'w') as f:
+                if human:
+                    json.dump(prob_map_json, f, indent=2, allow_nan=False)
+                else:
+                    json.dump(prob_map_json, f, separators=(',', ':'), allow_nan=False)
+        print(f"✓ Exported JSON: {json_file}")
+
+        if ndjson_file is not None:
+            # Each record is encoded and written on its own, so the output
+            # never exists as one string in memory. The records are the
+            # normalized JSON ones, so missing medians are null either way
+            with open(ndjson_file, 'wb', buffering=EXPORT_BUFFER_SIZE) as f:
+                for record in prob_map_json:
+                    if orjson is not None:
+                        f.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+                    else:
+                        f.write(json.dumps(record, separators=(',', ':'),
+                                           allow_nan=False).encode() + b'\n')
+            print(f"✓ Exported NDJSON: {ndjson_file}")
+
+        # Also save daily data for validation
+        if daily_csv or pyarrow is None:
+            with open(daily_data_file, 'w', buffering=EXPORT_BUFFER_SIZE, newline='') as f:
+                daily_data.to_csv(f, index=False)
+            print(f"✓ Exported daily data: {daily_data_file}")
+
+        # The readers take the Parquet copy only when it is at least as new
+        # as its text export, but a worker write can finish before the text
+        # files close. Once every text file is closed, each Parquet file is
+        # stamped so it is never older than them
+        for parquet_file, job in parquet_jobs:
+            job.result()
+            os.utime(parquet_file)
+            print(f"✓ Exported Parquet: {parquet_file}")
+
+    if parquet_jobs:
+        print("  (CSV/JSON are kept for compatibility; new consumers should read the Parquet files)")
 
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
 
-def main():
-    """Main analysis workflow."""
+def main(human=False, ndjson_file=None, daily_csv=True):
+    """Main analysis workflow (human: indent the JSON export; ndjson_file:
+    also stream the map as NDJSON; daily_csv: write the daily CSV)."""
     print("\n" + "="*80)
     print("108-VARIANT NY PROBABILITY MAP ANALYSIS")
     print("Continuous Gapless Sessions: Asia 16-02, London 02-08, NY 08-16")
     print("="*80)
 
-    # Step 1: Load data
-    df = load_clean_data()
+    # Steps 1-2 are reused from the Parquet cache while the minute CSV is
+    # unchanged (df is then just the cached NY bars). Only a cache miss
+    # holds the full minute frame in memory; everything after step 2 works
+    # on one row per trading day
+    cached = load_cached_sessions()
 
-    # Step 2: Calculate session boundaries
-    sessions_df = calculate_daily_sessions(df)
-
-    # Step 3: Calculate 4-factor context
-    sessions_df = calculate_asia_range_regime(sessions_df)
-    sessions_df = calculate_london_sweep(sessions_df)
-    sessions_df = calculate_open_vs_london_mid(
-        sessions_df, 'transition_open', 'transition_vs_london_mid'
-    )
-    sessions_df = calculate_open_vs_london_mid(
-        sessions_df, 'ny_open', 'ny_open_vs_london_mid'
-    )
-    sessions_df = create_variant_fingerprint(sessions_df)
-
-    # Step 4: Calculate labels
-    sessions_df = calculate_labels(sessions_df)
+    if cached is not None:
+        sessions_df, df = cached
+    else:
+        # Step 1: Load data
+        df = load_clean_data()
+
+        # Step 2: Calculate session boundaries
+        sessions_df = calculate_daily_sessions(df)
+        save_sessions(sessions_df, df)
+
+    # Steps 3-4: 4-factor context and labels. Every step adds its columns
+    # to sessions_df (and drops rows) in place and returns it, so the chain
+    # works on a single frame. The steps stay serial: the regime filter must
+    # run before the others, and sweep/position take ~2 ms each on a few
+    # thousand days, less than a thread pool's dispatch and merge
+    sessions_df = (sessions_df
+                   .pipe(calculate_asia_range_regime)
+                   .pipe(calculate_london_sweep)
+                   .pipe(calculate_london_mid_band)
+                   .pipe(calculate_open_vs_london_mid, 'transition_open', 'transition_vs_london_mid')
+                   .pipe(calculate_open_vs_london_mid, 'ny_open', 'ny_open_vs_london_mid')
+                   .pipe(create_variant_fingerprint)
+                   .pipe(calculate_labels, df))
 
     # Step 5: Aggregate probabilities
     prob_map = aggregate_probabilities(sessions_df)
 
     # Step 6: Export results
-    export_results(prob_map, sessions_df)
+    export_results(prob_map, sessions_df, ndjson_file=ndjson_file, daily_csv=daily_csv,
+                   human=human)
 
     print("\n" + "="*80)
     print("✓ ANALYSIS COMPLETE")
@@ -614,4 +784,14 @@ def main():
     print("2. Run generate_pinescript.py to create TradingView indicator")
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Build the 108-variant NY probability map.')
+    parser.add_argument('--human', action='store_true',
+                        help='indent the JSON export for reading (compact by default)')
+    parser.add_argument('--ndjson', metavar='PATH',
+                        help='also write the map as newline-delimited JSON, one variant per line')
+    parser.add_argument('--no-daily-csv', dest='daily_csv', action='store_false',
+                        help='skip daily_sessions_with_labels.csv and keep only its Parquet copy '
+                             '(needs pyarrow; models/base_model/backtest.py and '
+                             'compare_models.py read the CSV)')
+    args = parser.parse_args()
+    main(human=args.human, ndjson_file=args.ndjson, daily_csv=args.daily_csv)